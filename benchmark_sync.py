@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from contextlib import redirect_stdout
+
+# Benchmark harness for the sync and migration scripts, run against mock_tableau_server.py.
+# Every scenario gets a freshly seeded mock server (in a separate process, so its memory is
+# not counted) and records API calls per endpoint, wall time and the client's peak memory:
+#   python benchmark_sync.py --sizes 1000 10000 100000 --latency 0.01 --output bench_results.json
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+USERS_PER_GROUP = 100
+PAT_NAME = "benchmark"
+PAT_SECRET = "benchmark"
+
+def start_mock_server(users, latency, throttle_rate, max_page_size):
+    """
+    Starts mock_tableau_server.py on a free port and returns (process, url).
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_tableau_server.py")
+    process = subprocess.Popen(
+        [sys.executable, script, "--port", "0", "--users", str(users),
+         "--groups", str(max(10, users // USERS_PER_GROUP)), "--latency", str(latency),
+         "--throttle-rate", str(throttle_rate), "--max-page-size", str(max_page_size)],
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if "listening on" not in line:
+        process.kill()
+        raise RuntimeError(f"Mock server did not start: {line!r}")
+    return process, line.rsplit(" ", 1)[1].strip()
+
+def mock_stats(url):
+    with urllib.request.urlopen(f"{url}/mock/stats") as response:
+        return json.load(response)
+
+def run_sync(url, max_workers):
+    from tableau_common import connect_to_site
+    from tableau_sync_user_groups import (execute_sync_plan, get_all_users, get_group_items, get_group_memberships,
+                                          get_group_name_id_map, plan_membership_sync)
+
+    server_a, _ = connect_to_site(url, "site-a", PAT_NAME, PAT_SECRET)
+    server_b, governor_b = connect_to_site(url, "site-b", PAT_NAME, PAT_SECRET, max_workers)
+    group_items_b = get_group_items(server_b)
+    groups_b = get_group_name_id_map(server_b, group_items_b)
+    plan = plan_membership_sync(get_all_users(server_a), get_all_users(server_b), get_group_memberships(server_a)[0],
+                                get_group_memberships(server_b)[0], groups_b)
+    return execute_sync_plan(server_b, plan, group_items_b, max_workers, governor_b)
+
+def run_stream_sync(url, max_workers):
+    from tableau_common import connect_to_site
+    from tableau_sync_user_groups import get_group_items, stream_sync
+
+    server_a, _ = connect_to_site(url, "site-a", PAT_NAME, PAT_SECRET)
+    server_b, governor_b = connect_to_site(url, "site-b", PAT_NAME, PAT_SECRET, max_workers)
+    return stream_sync(server_a, server_b, get_group_items(server_b), max_workers, governor_b)
+
+def run_migration(url, max_workers):
+    from tableau_common import connect_to_site
+    from group_migration import get_group_items, migrate_groups
+
+    server_a, _ = connect_to_site(url, "site-a", PAT_NAME, PAT_SECRET)
+    server_c, governor_c = connect_to_site(url, "site-c", PAT_NAME, PAT_SECRET, max_workers)
+    return migrate_groups(server_a, server_c, list(get_group_items(server_a).values()), max_workers, governor_c)
+
+SCENARIOS = {"sync": run_sync, "sync-stream": run_stream_sync, "migration": run_migration}
+
+def run_scenario(name, users, args):
+    """
+    Runs one scenario against a fresh mock server and returns its measurements.
+    """
+    from tableau_common import STATS
+
+    process, url = start_mock_server(users, args.latency, args.throttle_rate, args.max_page_size)
+    try:
+        STATS.reset()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            counts = SCENARIOS[name](url, args.max_workers)
+        seconds = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stats = mock_stats(url)
+    finally:
+        process.kill()
+        process.wait()
+    return {
+        "scenario": name,
+        "users": users,
+        "seconds": round(seconds, 3),
+        "api_calls": stats["total"],
+        "calls_by_endpoint": stats["calls"],
+        "peak_memory_mb": round(peak_memory / 1024 / 1024, 2),
+        "results": counts,
+        "client_stats": STATS.summary(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync and migration scripts against a mock server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Site A user counts to run")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--max-workers", type=int, default=8, help="Concurrent writes per run")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the mock adds to every request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of mock requests answered with 429")
+    parser.add_argument("--max-page-size", type=int, default=1000, help="Largest page size the mock serves")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Keep benchmark sign-ins out of the real token cache
+    import tableau_common
+    tableau_common.SESSIONS.cache_file = os.path.join(tempfile.mkdtemp(), "tokens.json")
+
+    results = []
+    print(f"{'Scenario':<12}  {'Users':>7}  {'API calls':>9}  {'Seconds':>8}  {'Peak MB':>8}")
+    for users in args.sizes:
+        for name in args.scenarios:
+            result = run_scenario(name, users, args)
+            results.append(result)
+            print(f"{name:<12}  {users:>7}  {result['api_calls']:>9}  {result['seconds']:>8.2f}  "
+                  f"{result['peak_memory_mb']:>8.2f}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults written to '{args.output}'.")
+
+# Run the main function when the script is executed
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,333 @@
 import tableauserverclient as TSC
+import argparse
+import sys
+import threading
+from tableau_common import (STATS, DEFAULT_MAX_WORKERS, MAX_PAGE_SIZE, ProgressLine, add_site_arguments,
+                            add_stats_arguments, confirm, connect_to_site, matches_any, parallel_pager,
+                            resolve_max_workers, run_concurrently, site_from_args)
+from tableau_snapshot import DEFAULT_MAX_AGE, SNAPSHOT_FILE, SiteSnapshot
+from tableau_sync_user_groups import (BULK_ADD_BATCH_SIZE, MembershipAdd, add_batch_to_group, batch_adds_by_group,
+                                      get_all_users, supports_bulk_membership)
 
-# Function to authenticate and connect to a Tableau site
-def connect_to_site(server_url, site_name, token_name, token_value):
-    tableau_auth = TSC.PersonalAccessTokenAuth(token_name, token_value, site_name)
-    server = TSC.Server(server_url, use_server_version=True)
-    server.auth.sign_in(tableau_auth)
-    return server
-
-# Function to fetch all groups from a site, excluding "All Users"
-def get_groups(server):
-    all_groups = TSC.Pager(server.groups)
-    return [group.name for group in all_groups if group.name != "All Users"]
-
-# Function to create groups on another site
-def create_groups(server, groups_to_create):
-    for group_name in groups_to_create:
-        try:
-            new_group = TSC.GroupItem(group_name)
-            server.groups.create(new_group)
+# Mirror mode refuses to delete more groups than this unless --max-deletions is raised
+DEFAULT_MAX_DELETIONS = 20
+
+# Function to fetch all groups from a site as {name: id}, excluding "All Users".
+# Always listed from the server: mirror deletions must see the groups created in the same run.
+def get_group_ids(server):
+    all_groups = parallel_pager(server.groups, TSC.RequestOptions(pagesize=MAX_PAGE_SIZE))
+    return {group.name: group.id for group in all_groups if group.name != "All Users"}
+
+# Function to fetch all groups from a site as {name: GroupItem}, excluding "All Users".
+# The GroupItems carry the domain, minimum site role and grant-license mode of each group.
+def get_group_items(server):
+    all_groups = parallel_pager(server.groups, TSC.RequestOptions(pagesize=MAX_PAGE_SIZE))
+    return {group.name: group for group in all_groups if group.name != "All Users"}
+
+# Function to get the usernames of a group, from 'snapshot' (a SiteSnapshot) when they are fresh
+def get_member_names(server, group, snapshot=None):
+    user_names = snapshot.group_members(group.id) if snapshot else None
+    if user_names is None:
+        server.groups.populate_users(group, TSC.RequestOptions(pagesize=MAX_PAGE_SIZE))
+        user_names = [user.name for user in group.users]
+        if snapshot:
+            snapshot.save_group_members(group.id, group.name, user_names)
+    return user_names
+
+# Function to look up a group by name, ignoring case like the server does when it rejects a duplicate
+def find_group(server, group_name):
+    matches = [group for name, group in get_group_items(server).items() if name.lower() == group_name.lower()]
+    return matches[0] if matches else None
+
+def is_local(group):
+    return group.domain_name in (None, "local")
+
+# Function to create a group on the destination with the domain, minimum site role and
+# grant-license mode of 'source_group', or to bring an existing group's attributes in line.
+# Returns ('created', 'updated', 'unchanged' or 'failed', destination GroupItem or None).
+def ensure_group(server, source_group, destination_group=None):
+    group_name = source_group.name
+    try:
+        if destination_group is None:
+            new_group = TSC.GroupItem(group_name, source_group.domain_name)
+            new_group.minimum_site_role = source_group.minimum_site_role
+            new_group.license_mode = source_group.license_mode
+            if is_local(source_group):
+                created = server.groups.create(new_group)
+            else:
+                created = server.groups.create_AD_group(new_group)
             print(f"Group '{group_name}' created successfully.")
-        except Exception as e:
-            print(f"Failed to create group '{group_name}': {e}")
-
-# Inputs
-site_a_url = input("Enter Site A URL (e.g., https://your-tableau-cloud-url): ").strip()
-site_a_name = input("Enter Site A name: ").strip()
-site_a_token_name = input("Enter PAT name for Site A: ").strip()
-site_a_token_value = input("Enter PAT value for Site A: ").strip()
-
-site_b_url = input("Enter Site B URL (e.g., https://your-tableau-cloud-url): ").strip()
-site_b_name = input("Enter Site B name: ").strip()
-site_b_token_name = input("Enter PAT name for Site B: ").strip()
-site_b_token_value = input("Enter PAT value for Site B: ").strip()
-
-# Connect to Site A and fetch groups
-print("\nConnecting to Site A...")
-server_a = connect_to_site(site_a_url, site_a_name, site_a_token_name, site_a_token_value)
-groups_in_site_a = get_groups(server_a)
-server_a.auth.sign_out()
-
-# Display groups with numbering
-print("\nGroups in Site A (excluding 'All Users'):")
-for i, group in enumerate(groups_in_site_a, 1):
-    print(f"{i}. {group}")
-
-# Select groups to exclude by their numbers
-exclude_numbers = input("\nEnter the numbers of the groups to exclude (comma-separated): ")
-exclude_numbers = [int(num.strip()) for num in exclude_numbers.split(",") if num.strip().isdigit()]
-
-# Filter out the excluded groups
-groups_to_import = [group for i, group in enumerate(groups_in_site_a, 1) if i not in exclude_numbers]
-
-# Connect to Site B and create groups
-print("\nConnecting to Site B...")
-server_b = connect_to_site(site_b_url, site_b_name, site_b_token_name, site_b_token_value)
-create_groups(server_b, groups_to_import)
-server_b.auth.sign_out()
-
-print("\nDone!")
+            return "created", created
+
+        if is_local(source_group) != is_local(destination_group):
+            print(f"WARNING: Group '{group_name}' is in domain '{source_group.domain_name}' on Site A but "
+                  f"'{destination_group.domain_name}' on Site B. Attributes not copied.")
+            return "unchanged", destination_group
+        # Local groups only take the minimum site role, their license is granted on sign in
+        attributes = ("minimum_site_role",) if is_local(source_group) else ("minimum_site_role", "license_mode")
+        # An attribute Site A does not set cannot be cleared through an update, leave it as it is
+        attributes = [name for name in attributes if getattr(source_group, name) is not None]
+        if all(getattr(destination_group, name) == getattr(source_group, name) for name in attributes):
+            return "unchanged", destination_group
+        for name in attributes:
+            setattr(destination_group, name, getattr(source_group, name))
+        updated = server.groups.update(destination_group)
+        print(f"Group '{group_name}' updated (minimum site role: {source_group.minimum_site_role}, "
+              f"grant license: {source_group.license_mode}).")
+        return "updated", updated
+    except TSC.ServerResponseError as e:
+        # A retried create the server had already applied, or a name differing only in case
+        if destination_group is None and str(e.code).startswith("409"):
+            existing = find_group(server, group_name)
+            if existing is not None:
+                print(f"Group '{group_name}' already exists on Site B as '{existing.name}'. Updating it instead.")
+                return ensure_group(server, source_group, existing)
+        print(f"Failed to migrate group '{group_name}': {e}")
+    except Exception as e:
+        print(f"Failed to migrate group '{group_name}': {e}")
+    return "failed", None
+
+# Thread-safe counters of a group migration (groups created/updated, members added...)
+class MigrationTotals:
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, count=1):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def get(self, key):
+        return self.counts.get(key, 0)
+
+# Function to migrate one group: create or update it on the destination, then add the members
+# it has on the source and is missing on the destination, in bulk where the server supports it.
+# Returns 'success', 'skipped' (nothing to change) or 'failed' and adds its counts to 'totals'.
+def migrate_group(server_a, server_b, source_group, destination_group, user_ids_b, bulk, totals,
+                  snapshot_a=None, snapshot_b=None, members=True):
+    action, destination_group = ensure_group(server_b, source_group, destination_group)
+    totals.add(action)
+    if action == "failed":
+        return "failed"
+    if not members:
+        return "skipped" if action == "unchanged" else "success"
+
+    try:
+        source_members = get_member_names(server_a, source_group, snapshot_a)
+        # Only a new local group is known to be empty, an AD group is created with its directory members
+        if action == "created" and is_local(source_group):
+            existing = set()
+        else:
+            existing = set(get_member_names(server_b, destination_group, snapshot_b))
+    except Exception as e:
+        print(f"  -> ERROR: Could not get members for group '{source_group.name}': {e}")
+        return "failed"
+
+    adds = [
+        MembershipAdd(user_name, user_ids_b[user_name], source_group.name, destination_group.id)
+        for user_name in source_members
+        if user_name in user_ids_b and user_name not in existing
+    ]
+    missing_users = sum(user_name not in user_ids_b for user_name in source_members)
+    totals.add("members_missing_users", missing_users)
+    totals.add("members_existing", len(source_members) - missing_users - len(adds))
+    if not adds:
+        return "skipped" if action == "unchanged" else "success"
+
+    # Site B members of this group are about to change, do not serve them from the snapshot next run
+    if snapshot_b:
+        snapshot_b.expire_group_members([destination_group.id])
+    statuses = []
+    for batch in batch_adds_by_group(adds, BULK_ADD_BATCH_SIZE if bulk else 1):
+        statuses += add_batch_to_group(server_b, batch, {destination_group.id: destination_group}, bulk)
+    for status in statuses:
+        totals.add(f"members_{status}")
+    return "failed" if "failed" in statuses else "success"
+
+# Function to migrate groups with their attributes and (with 'members') their memberships.
+# Each group is one job on a pool of 'max_workers': its creation or update is followed right away
+# by its member writes, so member writes of early groups overlap with the creation of later ones.
+# Site B users and both sites' group members are served from the snapshots when fresh.
+def migrate_groups(server_a, server_b, source_groups, max_workers, governor=None, snapshot_a=None,
+                   snapshot_b=None, members=True):
+    # Group names are unique regardless of case, so a case variant is updated rather than created
+    destination_groups = {name.casefold(): group for name, group in get_group_items(server_b).items()}
+    user_ids_b = get_all_users(server_b, snapshot_b) if members else {}
+    bulk = supports_bulk_membership(server_b)
+    totals = MigrationTotals()
+
+    _, counts = run_concurrently(
+        source_groups,
+        lambda group: migrate_group(server_a, server_b, group, destination_groups.get(group.name.casefold()), user_ids_b,
+                                    bulk, totals, snapshot_a, snapshot_b, members),
+        max_workers, governor)
+
+    print(f"\nGroups created: {totals.get('created')}, Updated: {totals.get('updated')}, "
+          f"Unchanged: {totals.get('unchanged')}, Failed: {totals.get('failed')}")
+    if members:
+        print(f"Members added: {totals.get('members_success')}, Skipped: "
+              f"{totals.get('members_existing') + totals.get('members_skipped')}, "
+              f"Failed: {totals.get('members_failed')}, "
+              f"Not on Site B: {totals.get('members_missing_users')}")
+    counts.update(totals.counts)
+    return counts
+
+# Function to delete a single group, returns 'success', 'skipped' (already gone) or 'failed'
+def delete_group(server, group_name, group_id):
+    try:
+        server.groups.delete(group_id)
+        print(f"Group '{group_name}' deleted.")
+        return "success"
+    except TSC.ServerResponseError as e:
+        if str(e.code).startswith("404"):
+            print(f"Group '{group_name}' no longer exists. Skipping.")
+            return "skipped"
+        print(f"Failed to delete group '{group_name}': {e}")
+    except Exception as e:
+        print(f"Failed to delete group '{group_name}': {e}")
+    return "failed"
+
+# Function to find the groups of the destination that do not exist on the source (mirror mode).
+# Names are compared ignoring case, like the server does, so a group adopted under a
+# differently cased name is kept. Groups matching one of 'exclude_patterns' are never deleted.
+# Returns {name: id}.
+def plan_group_deletions(groups_in_source, group_ids_in_destination, exclude_patterns=()):
+    source_names = {name.casefold() for name in groups_in_source}
+    return {
+        name: group_id for name, group_id in group_ids_in_destination.items()
+        if name.casefold() not in source_names and not matches_any(name, exclude_patterns)
+    }
+
+# Function to delete groups on a site, up to 'max_workers' at a time.
+# Nothing is deleted when there are more than 'max_deletions' groups to delete.
+def delete_groups(server, groups_to_delete, max_workers, governor=None, max_deletions=DEFAULT_MAX_DELETIONS):
+    counts = {"success": 0, "skipped": 0, "failed": 0}
+    if len(groups_to_delete) > max_deletions:
+        print(f"\nWARNING: {len(groups_to_delete)} groups to delete exceed the safety cap of {max_deletions} "
+              f"(--max-deletions). No groups will be deleted.")
+        return counts
+    if groups_to_delete:
+        _, counts = run_concurrently(groups_to_delete.items(), lambda group: delete_group(server, *group),
+                                     max_workers, governor)
+    print(f"\nDeleted: {counts['success']}, Skipped: {counts['skipped']}, Failed: {counts['failed']}")
+    return counts
+
+# Function to copy groups between two sites without prompts (used for config-driven runs).
+# Each site is a dictionary with 'server_url', 'site', 'pat_name' and 'pat_secret'.
+# Groups matching one of 'exclude_patterns' (globs, or regexes prefixed with 're:') are skipped.
+# With 'members', group memberships are copied too (see migrate_groups).
+# With 'mirror', destination groups missing on the source are deleted (see delete_groups).
+def propagate_groups(source, destination, exclude_patterns=(), max_workers=DEFAULT_MAX_WORKERS,
+                     mirror=False, max_deletions=DEFAULT_MAX_DELETIONS, members=True,
+                     snapshot_file=SNAPSHOT_FILE, max_age=DEFAULT_MAX_AGE):
+    server_a, _ = connect_to_site(source["server_url"], source["site"], source["pat_name"], source["pat_secret"])
+    source_groups = get_group_items(server_a)
+    groups_to_import = [group for name, group in source_groups.items() if not matches_any(name, exclude_patterns)]
+
+    server_b, governor_b = connect_to_site(destination["server_url"], destination["site"],
+                                           destination["pat_name"], destination["pat_secret"], max_workers)
+    snapshot_a = SiteSnapshot(source["server_url"], source["site"], max_age, snapshot_file)
+    snapshot_b = SiteSnapshot(destination["server_url"], destination["site"], max_age, snapshot_file)
+    try:
+        counts = migrate_groups(server_a, server_b, groups_to_import, max_workers, governor_b,
+                                snapshot_a, snapshot_b, members)
+    finally:
+        snapshot_a.close()
+        snapshot_b.close()
+    if mirror:
+        groups_to_delete = plan_group_deletions(source_groups, get_group_ids(server_b), exclude_patterns)
+        deleted = delete_groups(server_b, groups_to_delete, max_workers, governor_b, max_deletions)
+        counts = dict(counts, deleted=deleted["success"], failed=counts["failed"] + deleted["failed"])
+    return counts
+
+def main():
+    # Options (sites and PATs can also come from environment variables, see --help)
+    parser = argparse.ArgumentParser(
+        description="Copy groups from Site A to Site B with their domain, minimum site role, grant-license mode "
+                    "and members.")
+    add_site_arguments(parser, "a")
+    add_site_arguments(parser, "b")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="Skip groups matching this glob ('Test*') or regex ('re:^QA ') pattern; repeatable. "
+                             "Without it, groups to skip are picked by number on a terminal")
+    parser.add_argument("--max-workers", type=int,
+                        help=f"Concurrent writes to Site B (default: prompt, or {DEFAULT_MAX_WORKERS} without a terminal)")
+    parser.add_argument("--groups-only", action="store_true",
+                        help="Copy the groups and their attributes but not their members")
+    parser.add_argument("--mirror", action="store_true",
+                        help="Also delete Site B groups that do not exist on Site A (excluded groups are kept)")
+    parser.add_argument("--yes", action="store_true", help="Delete groups in mirror mode without asking for confirmation")
+    parser.add_argument("--max-deletions", type=int, default=DEFAULT_MAX_DELETIONS,
+                        help=f"In mirror mode, delete nothing if more groups than this would be deleted "
+                             f"(default {DEFAULT_MAX_DELETIONS})")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE,
+                        help=f"Refetch cached users and group members older than this many seconds "
+                             f"(default {DEFAULT_MAX_AGE}, 0 forces a full refetch)")
+    parser.add_argument("--snapshot-file", default=SNAPSHOT_FILE,
+                        help=f"SQLite file holding the site snapshots (default {SNAPSHOT_FILE})")
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+    ProgressLine.enabled = args.progress
+
+    # Inputs
+    site_a = site_from_args(args, "a")
+    site_b = site_from_args(args, "b")
+    max_workers = resolve_max_workers(args.max_workers)
+
+    # Connect to Site A and fetch groups with their attributes
+    print("\nConnecting to Site A...")
+    server_a, _ = connect_to_site(site_a["server_url"], site_a["site"], site_a["pat_name"], site_a["pat_secret"])
+    source_groups = get_group_items(server_a)
+    groups_in_site_a = list(source_groups)
+
+    if args.exclude or not sys.stdin.isatty():
+        # Filter out the groups matching an exclusion pattern
+        groups_to_import = [group for group in groups_in_site_a if not matches_any(group, args.exclude)]
+        print(f"\n{len(groups_in_site_a) - len(groups_to_import)} of {len(groups_in_site_a)} groups excluded "
+              f"by pattern.")
+    else:
+        # Display groups with numbering
+        print("\nGroups in Site A (excluding 'All Users'):")
+        for i, group in enumerate(groups_in_site_a, 1):
+            print(f"{i}. {group}")
+
+        # Select groups to exclude by their numbers
+        exclude_numbers = input("\nEnter the numbers of the groups to exclude (comma-separated): ")
+        exclude_numbers = [int(num.strip()) for num in exclude_numbers.split(",") if num.strip().isdigit()]
+
+        # Filter out the excluded groups
+        groups_to_import = [group for i, group in enumerate(groups_in_site_a, 1) if i not in exclude_numbers]
+
+    # Connect to Site B and migrate the groups (and their members) in one pass
+    print("\nConnecting to Site B...")
+    server_b, governor_b = connect_to_site(site_b["server_url"], site_b["site"], site_b["pat_name"],
+                                           site_b["pat_secret"], max_workers)
+    snapshot_a = SiteSnapshot(site_a["server_url"], site_a["site"], args.max_age, args.snapshot_file)
+    snapshot_b = SiteSnapshot(site_b["server_url"], site_b["site"], args.max_age, args.snapshot_file)
+    try:
+        counts = migrate_groups(server_a, server_b, [source_groups[group] for group in groups_to_import],
+                                max_workers, governor_b, snapshot_a, snapshot_b, members=not args.groups_only)
+    finally:
+        snapshot_a.close()
+        snapshot_b.close()
+
+    # Mirror: delete Site B groups that Site A does not have
+    if args.mirror:
+        groups_to_delete = plan_group_deletions(groups_in_site_a, get_group_ids(server_b), args.exclude)
+        for group in groups_to_delete:
+            print(f"  -> Will delete group '{group}'.")
+        if not groups_to_delete:
+            print("\nNo Site B groups to delete.")
+        elif confirm(f"\nDelete {len(groups_to_delete)} groups on Site B?", args.yes):
+            deleted = delete_groups(server_b, groups_to_delete, max_workers, governor_b, args.max_deletions)
+            counts["failed"] += deleted["failed"]
+
+    STATS.print_summary(args.stats_json)
+    print("\nDone!")
+    # Non-zero exit status for schedulers when any group or member write failed
+    if counts["failed"]:
+        sys.exit(1)
+
+# Run the main function when the script is executed
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import quoteattr
+
+# Local stand-in for the Tableau REST endpoints used by the scripts in this repo:
+# server info, sign-in/out, users, groups, group membership and user groups.
+# Run it directly to get seeded sites (see seed_sites):
+#   python mock_tableau_server.py --users 10000 --groups 200 --latency 0.02 --throttle-rate 0.01
+# then point the scripts at http://127.0.0.1:<port> with any PAT name/secret.
+
+API_VERSION = "3.24"
+TABLEAU_NS = "http://tableau.com/api"
+
+class MockSite:
+    """
+    Users, groups and memberships of one mock site.
+    """
+    def __init__(self, content_url):
+        self.content_url = content_url
+        self.id = f"{content_url}-id"
+        self.users = {}   # user ID -> {'name', 'site_role'}
+        self.groups = {}  # group ID -> {'name', 'domain', 'site_role', 'license_mode', 'members': set of user IDs}
+        self.directory = {}  # (domain, group name) -> user names imported when that AD group is created
+
+    def add_user(self, name, site_role="Viewer"):
+        user_id = str(uuid.uuid4())
+        self.users[user_id] = {"name": name, "site_role": site_role}
+        return user_id
+
+    def add_group(self, name, domain="local", site_role=None, license_mode=None):
+        group_id = str(uuid.uuid4())
+        self.groups[group_id] = {"name": name, "domain": domain, "site_role": site_role,
+                                 "license_mode": license_mode, "members": set()}
+        return group_id
+
+class MockTableauServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the mock sites and the request options:
+    'latency' seconds added to every request, 'max_page_size' cap,
+    'throttle_rate' share of requests answered with 429 + Retry-After,
+    and 'token_ttl' seconds after which a session token expires (0 = never).
+    Calls are counted per method and endpoint for the benchmark harness.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, max_page_size=1000, throttle_rate=0.0, token_ttl=0):
+        super().__init__(address, MockRequestHandler)
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.throttle_rate = throttle_rate
+        self.token_ttl = token_ttl
+        self.sites = {}
+        self.tokens = {}  # token -> (site, issued_at)
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def add_site(self, content_url):
+        self.sites[content_url] = MockSite(content_url)
+        return self.sites[content_url]
+
+    def count_call(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {"total": sum(self.calls.values()), "calls": dict(self.calls)}
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls = {}
+
+def seed_sites(server, users, groups, groups_per_user=3, destination_overlap=0.9, seed=0):
+    """
+    Seeds 'site-a' with users, groups and memberships, 'site-b' with a
+    share ('destination_overlap') of the same users and all groups but no
+    memberships (the starting point of a sync), and 'site-c' with the same
+    users as 'site-b' and no groups (the starting point of a group migration).
+    """
+    rng = random.Random(seed)
+    site_a = server.add_site("site-a")
+    site_b = server.add_site("site-b")
+    site_c = server.add_site("site-c")
+    group_ids = [site_a.add_group(f"Group {number:05d}") for number in range(groups)]
+    for number in range(groups):
+        site_b.add_group(f"Group {number:05d}")
+    for number in range(users):
+        name = f"user{number:06d}@example.com"
+        user_id = site_a.add_user(name)
+        for group_id in rng.sample(group_ids, min(groups_per_user, len(group_ids))):
+            site_a.groups[group_id]["members"].add(user_id)
+        if rng.random() < destination_overlap:
+            site_b.add_user(name)
+            site_c.add_user(name)
+    return site_a, site_b, site_c
+
+def user_xml(user_id, user):
+    return f'<user id="{user_id}" name={quoteattr(user["name"])} siteRole="{user["site_role"]}" />'
+
+def group_xml(group_id, group):
+    import_attributes = f' domainName={quoteattr(group["domain"])}'
+    if group["site_role"]:
+        import_attributes += f' siteRole="{group["site_role"]}"'
+    if group["license_mode"]:
+        import_attributes += f' grantLicenseMode="{group["license_mode"]}"'
+    return (f'<group id="{group_id}" name={quoteattr(group["name"])}>'
+            f'<domain name={quoteattr(group["domain"])} /><import{import_attributes} /></group>')
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("GET", "/serverInfo", "server_info"),
+        ("POST", "/auth/signin", "sign_in"),
+        ("POST", "/auth/signout", "sign_out"),
+        ("GET", "/sites/{site}/users", "list_users"),
+        ("GET", "/sites/{site}/users/{user}", "get_user"),
+        ("GET", "/sites/{site}/users/{user}/groups", "list_user_groups"),
+        ("GET", "/sites/{site}/groups", "list_groups"),
+        ("POST", "/sites/{site}/groups", "create_group"),
+        ("PUT", "/sites/{site}/groups/{group}", "update_group"),
+        ("DELETE", "/sites/{site}/groups/{group}", "delete_group"),
+        ("GET", "/sites/{site}/groups/{group}/users", "list_group_users"),
+        ("POST", "/sites/{site}/groups/{group}/users", "add_group_users"),
+        ("PUT", "/sites/{site}/groups/{group}/users/remove", "remove_group_users"),
+        ("DELETE", "/sites/{site}/groups/{group}/users/{user}", "remove_group_user"),
+    ]
+    ROUTE_PATTERNS = [
+        (method, template, re.compile(re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", template)), handler)
+        for method, template, handler in ROUTES
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    # --- Plumbing ---
+
+    def dispatch(self, method):
+        parts = urlsplit(self.path)
+        self.query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        if parts.path == "/mock/stats":
+            return self.send(200, json.dumps(self.server.stats()), "application/json")
+        if parts.path == "/mock/reset-stats":
+            self.server.reset_stats()
+            return self.send(200, "{}", "application/json")
+
+        match = re.match(r"^/api/[\d.]+(?P<rest>/.*)$", parts.path)
+        if not match:
+            return self.error(404, "404000", "Resource Not Found", parts.path)
+        for route_method, template, pattern, handler in self.ROUTE_PATTERNS:
+            params = pattern.fullmatch(match.group("rest"))
+            if route_method == method and params:
+                self.server.count_call(f"{method} {template}")
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                if self.server.throttle_rate and random.random() < self.server.throttle_rate:
+                    return self.error(429, "429000", "Too Many Requests", "Rate limit exceeded.", {"Retry-After": "1"})
+                if handler not in ("server_info", "sign_in") and not self.authorized(params.groupdict().get("site")):
+                    return self.error(401, "401002", "Unauthorized Access", "Invalid authentication credentials were provided.")
+                return getattr(self, handler)(**params.groupdict())
+        return self.error(405, "405000", "Method Not Allowed", f"{method} {parts.path}")
+
+    def authorized(self, site_id):
+        token = self.headers.get("X-Tableau-Auth")
+        with self.server.lock:
+            entry = self.server.tokens.get(token)
+        if not entry:
+            return False
+        site, issued_at = entry
+        if self.server.token_ttl and time.time() - issued_at > self.server.token_ttl:
+            return False
+        self.site = site
+        return site_id is None or site_id == site.id
+
+    def send(self, status, body, content_type="application/xml", headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def respond(self, status, inner):
+        self.send(status, f'<?xml version="1.0" encoding="UTF-8"?><tsResponse xmlns="{TABLEAU_NS}">{inner}</tsResponse>')
+
+    def error(self, status, code, summary, detail, headers=None):
+        self.send(status, f'<?xml version="1.0" encoding="UTF-8"?><tsResponse xmlns="{TABLEAU_NS}">'
+                          f'<error code="{code}"><summary>{summary}</summary><detail>{detail}</detail></error>'
+                          f'</tsResponse>', headers=headers)
+
+    def page(self, items):
+        page_size = min(int(self.query.get("pageSize", 100)), self.server.max_page_size)
+        page_number = int(self.query.get("pageNumber", 1))
+        start = (page_number - 1) * page_size
+        pagination = f'<pagination pageNumber="{page_number}" pageSize="{page_size}" totalAvailable="{len(items)}" />'
+        return pagination, items[start:start + page_size]
+
+    def request_xml(self):
+        return ET.fromstring(self.body) if self.body else ET.Element("tsRequest")
+
+    def group_or_error(self, group):
+        found = self.site.groups.get(group)
+        if found is None:
+            self.error(404, "404002", "Resource Not Found", f"Group '{group}' could not be found.")
+        return found
+
+    # --- Endpoints ---
+
+    def server_info(self):
+        self.respond(200, f'<serverInfo><productVersion build="mock">2024.2</productVersion>'
+                          f'<restApiVersion>{API_VERSION}</restApiVersion></serverInfo>')
+
+    def sign_in(self):
+        try:
+            content_url = json.loads(self.body)["credentials"]["site"]["contentUrl"]
+        except ValueError:
+            site_element = self.request_xml().find(".//site")
+            content_url = site_element.get("contentUrl", "") if site_element is not None else ""
+        site = self.server.sites.get(content_url)
+        if site is None:
+            return self.error(401, "401001", "Signin Error", "Error signing in to Tableau Server")
+        token = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.tokens[token] = (site, time.time())
+        self.respond(200, f'<credentials token="{token}" estimatedTimeToExpiration="364:23:59:59">'
+                          f'<site id="{site.id}" contentUrl="{site.content_url}" />'
+                          f'<user id="mock-admin" /></credentials>')
+
+    def sign_out(self):
+        with self.server.lock:
+            self.server.tokens.pop(self.headers.get("X-Tableau-Auth"), None)
+        self.send(204, "")
+
+    def list_users(self, site):
+        pagination, users = self.page(list(self.site.users.items()))
+        self.respond(200, pagination + "<users>" + "".join(user_xml(*user) for user in users) + "</users>")
+
+    def get_user(self, site, user):
+        if user not in self.site.users:
+            return self.error(404, "404002", "Resource Not Found", f"User '{user}' could not be found.")
+        self.respond(200, user_xml(user, self.site.users[user]))
+
+    def list_user_groups(self, site, user):
+        groups = [(group_id, group) for group_id, group in self.site.groups.items() if user in group["members"]]
+        pagination, groups = self.page(groups)
+        self.respond(200, pagination + "<groups>" + "".join(group_xml(*group) for group in groups) + "</groups>")
+
+    def list_groups(self, site):
+        all_users = ("all-users", {"name": "All Users", "domain": "local", "site_role": None, "license_mode": None})
+        pagination, groups = self.page([all_users] + list(self.site.groups.items()))
+        self.respond(200, pagination + "<groups>" + "".join(group_xml(*group) for group in groups) + "</groups>")
+
+    def create_group(self, site):
+        element = self.request_xml().find(".//group")
+        import_element = element.find("import")
+        name = element.get("name")
+        attributes = dict(element.attrib, **(import_element.attrib if import_element is not None else {}))
+        with self.server.lock:
+            # Group names are unique regardless of case
+            if any(group["name"].lower() == name.lower() for group in self.site.groups.values()):
+                return self.error(409, "409009", "Conflict", f"A group with the name '{name}' already exists.")
+            group_id = self.site.add_group(
+                name,
+                domain=attributes.get("domainName", "local"),
+                site_role=attributes.get("minimumSiteRole") or attributes.get("siteRole") or attributes.get("SiteRole"),
+                license_mode=attributes.get("grantLicenseMode"),
+            )
+            # Like Tableau, an AD group arrives with the members it has in the directory
+            created = self.site.groups[group_id]
+            imported = set(self.site.directory.get((created["domain"], name), ()))
+            created["members"].update(user_id for user_id, user in self.site.users.items() if user["name"] in imported)
+        self.respond(201, group_xml(group_id, self.site.groups[group_id]))
+
+    def update_group(self, site, group):
+        found = self.group_or_error(group)
+        if found is None:
+            return
+        element = self.request_xml().find(".//group")
+        import_element = element.find("import")
+        attributes = dict(element.attrib, **(import_element.attrib if import_element is not None else {}))
+        with self.server.lock:
+            found["name"] = attributes.get("name", found["name"])
+            found["site_role"] = (attributes.get("minimumSiteRole") or attributes.get("siteRole")
+                                  or attributes.get("SiteRole") or found["site_role"])
+            found["license_mode"] = attributes.get("grantLicenseMode", found["license_mode"])
+        self.respond(200, group_xml(group, found))
+
+    def delete_group(self, site, group):
+        with self.server.lock:
+            if self.site.groups.pop(group, None) is None:
+                return self.error(404, "404002", "Resource Not Found", f"Group '{group}' could not be found.")
+        self.send(204, "")
+
+    def list_group_users(self, site, group):
+        found = self.group_or_error(group)
+        if found is None:
+            return
+        pagination, members = self.page(sorted(found["members"]))
+        self.respond(200, pagination + "<users>"
+                     + "".join(user_xml(user_id, self.site.users[user_id]) for user_id in members) + "</users>")
+
+    def add_group_users(self, site, group):
+        found = self.group_or_error(group)
+        if found is None:
+            return
+        user_ids = [user.get("id") for user in self.request_xml().iter("user")]
+        with self.server.lock:
+            for user_id in user_ids:
+                if user_id not in self.site.users:
+                    return self.error(404, "404002", "Resource Not Found", f"User '{user_id}' could not be found.")
+                if user_id in found["members"]:
+                    return self.error(409, "409011", "Conflict",
+                                      f"User '{user_id}' is already a member of group '{found['name']}'.")
+            found["members"].update(user_ids)
+        users = "".join(user_xml(user_id, self.site.users[user_id]) for user_id in user_ids)
+        self.respond(200, users if len(user_ids) == 1 else f"<users>{users}</users>")
+
+    def remove_group_users(self, site, group):
+        found = self.group_or_error(group)
+        if found is None:
+            return
+        with self.server.lock:
+            found["members"].difference_update(user.get("id") for user in self.request_xml().iter("user"))
+        self.send(200, "")
+
+    def remove_group_user(self, site, group, user):
+        found = self.group_or_error(group)
+        if found is None:
+            return
+        with self.server.lock:
+            found["members"].discard(user)
+        self.send(204, "")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the Tableau REST API.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (0 picks a free port)")
+    parser.add_argument("--users", type=int, default=1000, help="Users seeded on 'site-a'")
+    parser.add_argument("--groups", type=int, default=50, help="Groups seeded on both sites")
+    parser.add_argument("--groups-per-user", type=int, default=3, help="Site A groups per user")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--max-page-size", type=int, default=1000, help="Largest page size served")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--token-ttl", type=float, default=0, help="Seconds before tokens expire (0 = never)")
+    args = parser.parse_args()
+
+    server = MockTableauServer(("127.0.0.1", args.port), args.latency, args.max_page_size,
+                               args.throttle_rate, args.token_ttl)
+    seed_sites(server, args.users, args.groups, args.groups_per_user)
+    print(f"Mock Tableau server listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+# Run the main function when the script is executed
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,652 @@
+import copy
+import fnmatch
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import requests
+import xml.etree.ElementTree as ET
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util.retry import Retry
+
+# Default number of write requests kept in flight at once
+DEFAULT_MAX_WORKERS = 8
+
+# REST API version used for raw (non-TSC) requests, and seconds before such a request gives up
+API_VERSION = "3.24"
+REQUEST_TIMEOUT = 30
+
+# XML namespace of Tableau REST API responses
+TABLEAU_NS = "{http://tableau.com/api}"
+
+# Cached sign-in tokens, and how long (in seconds) a token is reused before signing in again.
+# Tableau sessions time out after 240 minutes by default, so reuse stays well below that.
+TOKEN_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".tableau_token_cache.json")
+SESSION_TTL = 120 * 60
+
+# Pages of a listing fetched concurrently ahead of the page being read (see parallel_pager)
+PAGE_PREFETCH = 4
+
+# Largest page size the Tableau REST API accepts for list endpoints
+MAX_PAGE_SIZE = 1000
+
+# Retry settings for throttled (429) and failed (5xx) requests
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 6
+BACKOFF_FACTOR = 1.0
+MAX_BACKOFF = 120
+
+class ThrottleGovernor:
+    """
+    Adaptive concurrency limit shared by the workers of one run.
+    The limit is halved every time the server throttles a request and grows
+    back by one after a full window of requests without throttling.
+    """
+    def __init__(self, max_workers):
+        self.max_workers = max(1, max_workers)
+        self.limit = self.max_workers
+        self.in_flight = 0
+        self.calm_streak = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.calm_streak += 1
+            if self.calm_streak >= self.limit and self.limit < self.max_workers:
+                self.limit += 1
+                self.calm_streak = 0
+            self.condition.notify_all()
+
+    def on_throttle(self):
+        with self.condition:
+            if self.limit > 1:
+                self.limit //= 2
+                print(f"  -> INFO: Server is throttling requests, reducing concurrency to {self.limit}.")
+            self.calm_streak = 0
+
+class RequestStats:
+    """
+    Instrumentation shared by every session prepared with configure_session():
+    call counts per endpoint, latency histograms, bytes transferred, error
+    classes, retries and time spent backing off. print_summary() reports
+    where a run spent its time (reads, writes or throttling) and can write
+    the same summary as JSON.
+    """
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    ID_PARENTS = {"sites", "groups", "users", "projects", "workbooks", "datasources", "views", "jobs"}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Start of the latest retry attempt of the request running on each thread
+        self.attempts = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.endpoints = {}
+        self.errors = {}
+        self.retries = {}
+        self.backoff_seconds = 0.0
+
+    @classmethod
+    def endpoint_name(cls, method, url):
+        # '/api/3.24/sites/<id>/groups/<id>/users' -> 'GET /sites/{id}/groups/{id}/users'
+        segments = urlsplit(url).path.split("/")
+        if len(segments) > 2 and segments[1] == "api":
+            segments = [""] + segments[3:]
+        for index in range(1, len(segments)):
+            if segments[index - 1] in cls.ID_PARENTS and segments[index] not in ("", "remove"):
+                segments[index] = "{id}"
+        return f"{method} {'/'.join(segments)}"
+
+    def record_response(self, response, **kwargs):
+        request = response.request
+        endpoint = self.endpoint_name(request.method, request.url)
+        seconds = response.elapsed.total_seconds()
+        attempt_started = getattr(self.attempts, "started", None)
+        self.attempts.started = None
+        if attempt_started is not None:
+            # 'elapsed' spans every retry of the request, only the final attempt counts
+            # as request time, the throttled attempts before it are in backoff_seconds
+            seconds = min(seconds, time.monotonic() - attempt_started)
+        body = request.body or b""
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                "calls": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes_sent": 0, "bytes_received": 0,
+                "latency_histogram": {f"<={bucket}s": 0 for bucket in self.LATENCY_BUCKETS} | {"slower": 0},
+            })
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["bytes_sent"] += len(body)
+            stats["bytes_received"] += len(response.content or b"")
+            bucket = next((f"<={bucket}s" for bucket in self.LATENCY_BUCKETS if seconds <= bucket), "slower")
+            stats["latency_histogram"][bucket] += 1
+            if response.status_code >= 400:
+                error_class = f"HTTP {response.status_code}"
+                self.errors[error_class] = self.errors.get(error_class, 0) + 1
+        return response
+
+    def record_retry(self, reason):
+        with self.lock:
+            self.retries[reason] = self.retries.get(reason, 0) + 1
+
+    def record_backoff(self, seconds):
+        # urllib3 retries on the thread that sent the request, the next attempt starts now
+        self.attempts.started = time.monotonic()
+        with self.lock:
+            self.backoff_seconds += seconds
+
+    def record_error(self, error):
+        error_class = type(error).__name__
+        with self.lock:
+            self.errors[error_class] = self.errors.get(error_class, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            endpoints = {name: dict(stats) for name, stats in self.endpoints.items()}
+            totals = {"read": 0.0, "write": 0.0}
+            for name, stats in endpoints.items():
+                totals["read" if name.startswith("GET ") else "write"] += stats["seconds"]
+            return {
+                "wall_seconds": round(time.monotonic() - self.started, 3),
+                "calls": sum(stats["calls"] for stats in endpoints.values()),
+                "read_seconds": round(totals["read"], 3),
+                "write_seconds": round(totals["write"], 3),
+                "backoff_seconds": round(self.backoff_seconds, 3),
+                "retries": dict(self.retries),
+                "errors": dict(self.errors),
+                "endpoints": endpoints,
+            }
+
+    def print_summary(self, json_file=None):
+        summary = self.summary()
+        print("\n--- REST API Summary ---")
+        print(f"{summary['calls']} calls in {summary['wall_seconds']:.1f}s "
+              f"(request time: reads {summary['read_seconds']:.1f}s, writes {summary['write_seconds']:.1f}s, "
+              f"backing off {summary['backoff_seconds']:.1f}s)")
+        for name, stats in sorted(summary["endpoints"].items(), key=lambda item: -item[1]["seconds"]):
+            average = stats["seconds"] / stats["calls"]
+            print(f"  {name:<45} {stats['calls']:>7} calls  avg {average:.3f}s  max {stats['max_seconds']:.3f}s  "
+                  f"{stats['bytes_received'] / 1024:.0f} KiB in")
+        if summary["retries"]:
+            print(f"Retries: {summary['retries']}")
+        if summary["errors"]:
+            print(f"Errors: {summary['errors']}")
+        if json_file:
+            with open(json_file, "w") as file:
+                json.dump(summary, file, indent=2)
+            print(f"Summary written to '{json_file}'.")
+        return summary
+
+class ProgressLine:
+    """
+    Optional live progress line (on stderr) with completed operations,
+    rate and, when the total is known, an ETA.
+    """
+    enabled = False
+
+    def __init__(self, total=None):
+        self.total = total
+        self.done = 0
+        self.started = time.monotonic()
+        self.last_shown = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, count=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.done += count
+            now = time.monotonic()
+            if now - self.last_shown < 0.5 and self.done != self.total:
+                return
+            self.last_shown = now
+            rate = self.done / max(now - self.started, 1e-6)
+            line = f"Progress: {self.done}" + (f"/{self.total}" if self.total else "") + f" done, {rate:.1f}/s"
+            if self.total and rate:
+                line += f", ETA {max(self.total - self.done, 0) / rate:.0f}s"
+            sys.stderr.write(f"\r{line}   ")
+            sys.stderr.flush()
+
+    def finish(self):
+        if self.enabled and self.done:
+            sys.stderr.write("\n")
+
+# Shared by every session and worker pool, summarised at the end of each run
+STATS = RequestStats()
+
+def add_stats_arguments(parser):
+    """
+    Adds the --progress and --stats-json options to a script's argument parser.
+    """
+    parser.add_argument("--progress", action="store_true", help="Show a live progress line with rate and ETA")
+    parser.add_argument("--stats-json", help="Also write the REST API summary of the run to this JSON file")
+
+class BackoffRetry(Retry):
+    """
+    urllib3 Retry with exponential backoff plus jitter. Retry-After is honored
+    for 429/503 responses, and throttling is reported to a ThrottleGovernor.
+    """
+    governor = None
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.governor = self.governor
+        return retry
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return min(MAX_BACKOFF, backoff + random.uniform(0, backoff))
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if self.governor and response is not None and response.status in (429, 503):
+            self.governor.on_throttle()
+        STATS.record_retry(f"HTTP {response.status}" if response is not None else type(error).__name__)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    def sleep(self, response=None):
+        started = time.monotonic()
+        super().sleep(response)
+        STATS.record_backoff(time.monotonic() - started)
+
+def configure_session(session, max_workers=1):
+    """
+    Prepares a requests session (a TSC server's 'server.session' or a plain
+    requests.Session) for use by up to 'max_workers' threads: the connection
+    pool is sized to match and every request is retried with backoff on 429/5xx.
+    Every response is recorded in STATS.
+    Returns the ThrottleGovernor that workers using this session should share.
+    """
+    governor = ThrottleGovernor(max_workers)
+    retry = BackoffRetry(
+        total=MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # retry writes too, the scripts treat "already exists" as skipped
+        backoff_factor=BACKOFF_FACTOR,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    retry.governor = governor
+    # Listings prefetch pages on the same session, keep enough connections open for them too
+    pool_size = max(max_workers, PAGE_PREFETCH)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(STATS.record_response)
+    return governor
+
+_host_sessions = {}
+_host_sessions_lock = threading.Lock()
+
+def session_for_host(server_url, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Returns one pooled, retrying requests session per host, so every site on
+    the same server reuses its connections. Cookies are not kept, so sign-ins
+    to different sites or with different PATs never share a server session.
+    """
+    host = urlsplit(server_url).netloc
+    with _host_sessions_lock:
+        if host not in _host_sessions:
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            configure_session(session, max_workers)
+            _host_sessions[host] = session
+        return _host_sessions[host]
+
+def rest_sign_in(session, server_url, content_url, pat_name, pat_secret, api_version=API_VERSION):
+    """
+    Signs in with a PAT through the raw REST API and returns a dictionary with
+    'token', 'site_id', 'user_id', 'content_url' and 'expires_in'
+    (the estimatedTimeToExpiration reported by the server).
+    Raises requests exceptions for HTTP errors and ET.ParseError for bad responses.
+    """
+    url = f"{server_url.rstrip('/')}/api/{api_version}/auth/signin"
+    data = {
+        "credentials": {
+            "personalAccessTokenName": pat_name,
+            "personalAccessTokenSecret": pat_secret,
+            "site": {"contentUrl": content_url},
+        }
+    }
+    response = session.post(url, json=data, headers={"Content-Type": "application/json"}, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+    credentials = ET.fromstring(response.text).find(f".//{TABLEAU_NS}credentials")
+    if credentials is None:
+        raise ET.ParseError("No credentials element in sign-in response.")
+    site = credentials.find(f"{TABLEAU_NS}site")
+    user = credentials.find(f"{TABLEAU_NS}user")
+    return {
+        "token": credentials.attrib.get("token"),
+        "site_id": site.attrib.get("id") if site is not None else None,
+        "user_id": user.attrib.get("id") if user is not None else None,
+        "content_url": site.attrib.get("contentUrl", "Unknown Site") if site is not None else "Unknown Site",
+        "expires_in": credentials.attrib.get("estimatedTimeToExpiration"),
+    }
+
+class SessionManager:
+    """
+    Signs in with PATs and keeps the resulting credentials tokens in a local
+    cache file (readable only by the current user), keyed by server URL, site
+    content URL and PAT name. A cached token is reused across runs until
+    SESSION_TTL has passed, and attach() re-authenticates automatically when
+    the server rejects a token mid-run (HTTP 401).
+
+    Sign-ins for different keys run in parallel: each key has its own lock
+    held during the sign-in, and the shared cache file is only locked while
+    it is read or rewritten.
+    """
+    def __init__(self, cache_file=TOKEN_CACHE_FILE, ttl=SESSION_TTL):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.cache_lock = threading.Lock()
+        self.key_locks = {}
+
+    @staticmethod
+    def _key(server_url, content_url, pat_name):
+        return f"{server_url.rstrip('/')}|{content_url}|{pat_name}"
+
+    def _key_lock(self, key):
+        with self.cache_lock:
+            return self.key_locks.setdefault(key, threading.RLock())
+
+    def _load(self):
+        try:
+            with open(self.cache_file, "r") as file:
+                cache = json.load(file)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, cache):
+        temp_file = f"{self.cache_file}.tmp"
+        with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as file:
+            json.dump(cache, file)
+        os.replace(temp_file, self.cache_file)
+
+    def sign_in(self, session, server_url, content_url, pat_name, pat_secret, api_version=API_VERSION, force=False):
+        """
+        Returns the rest_sign_in() result for a PAT, from the cache when a
+        token younger than the TTL exists, otherwise from a new sign-in
+        (always a new sign-in when 'force' is True).
+        """
+        key = self._key(server_url, content_url, pat_name)
+        with self._key_lock(key):
+            with self.cache_lock:
+                cached = self._load().get(key)
+            if not force and cached and time.time() - cached.get("signed_in_at", 0) < self.ttl:
+                return cached
+            signed_in = rest_sign_in(session, server_url, content_url, pat_name, pat_secret, api_version)
+            signed_in["signed_in_at"] = time.time()
+            with self.cache_lock:
+                cache = self._load()
+                cache[key] = signed_in
+                self._save(cache)
+            return signed_in
+
+    def attach(self, session, server_url, content_url, pat_name, pat_secret, on_new_token, api_version=API_VERSION):
+        """
+        Makes 'session' recover from expired tokens: a 401 response triggers a
+        new sign-in, on_new_token(signed_in) is called with the result, and the
+        request is sent once more with the new token.
+        """
+        key_lock = self._key_lock(self._key(server_url, content_url, pat_name))
+
+        def reauthenticate(response, **kwargs):
+            request = response.request
+            if response.status_code != 401 or "/auth/signin" in request.url or getattr(request, "reauthenticated", False):
+                return response
+            with key_lock:
+                cached = self.sign_in(session, server_url, content_url, pat_name, pat_secret, api_version)
+                if cached["token"] == request.headers.get("X-Tableau-Auth"):
+                    print(f"  -> INFO: Session token for site '{content_url}' expired. Signing in again...")
+                    cached = self.sign_in(session, server_url, content_url, pat_name, pat_secret, api_version, force=True)
+                on_new_token(cached)
+            retry = request.copy()
+            retry.headers["X-Tableau-Auth"] = cached["token"]
+            retry.reauthenticated = True
+            return session.send(retry, **kwargs)
+
+        session.hooks["response"].append(reauthenticate)
+
+# Shared by every script, so all of them reuse the same cached tokens
+SESSIONS = SessionManager()
+
+def connect_to_site(server_url, site_name, token_name, token_value, max_workers=1):
+    """
+    Authenticates and connects to a specific Tableau site using a PAT.
+    Returns a tableauserverclient Server and the ThrottleGovernor of its session.
+    'site_name' MUST be the Content URL (Site ID), not the friendly name.
+    All requests on the session are retried with backoff on 429/5xx.
+    A cached session token from an earlier run is reused when still valid,
+    and the session signs in again by itself if the token expires mid-run.
+    Exits the script if the sign-in fails.
+    """
+    # Only the scripts talking to sites through tableauserverclient need it
+    import tableauserverclient as TSC
+
+    print(f"Attempting to connect to site '{site_name}' at {server_url}...")
+    try:
+        server = TSC.Server(server_url)
+        governor = configure_session(server.session, max_workers)
+        server.use_server_version()
+
+        def use_token(signed_in):
+            # TSC has no public way to take a token signed in outside of server.auth
+            server._set_auth(signed_in["site_id"], signed_in["user_id"], signed_in["token"])
+
+        use_token(SESSIONS.sign_in(server.session, server_url, site_name, token_name, token_value, server.version))
+        SESSIONS.attach(server.session, server_url, site_name, token_name, token_value, use_token, server.version)
+        print(f"Successfully signed in to site '{site_name}'.")
+        return server, governor
+
+    except Exception as e:
+        print(f"FATAL ERROR connecting to site '{site_name}': {e}")
+        print("Please check your URL, Site Name (must be Content URL/Site ID), and PAT details.")
+        sys.exit(1) # Exit the script if connection fails
+
+def _run_worker(worker, item, governor, progress):
+    """
+    Runs one worker call, holding a governor slot while it runs.
+    A worker that raises is counted as 'failed'.
+    """
+    if governor:
+        governor.acquire()
+    try:
+        status = worker(item)
+    except Exception as e:
+        print(f"  -> UNEXPECTED ERROR while processing {item}: {e}")
+        STATS.record_error(e)
+        status = "failed"
+    finally:
+        if governor:
+            governor.release()
+    progress.update(1)
+    return status
+
+def _count_status(counts, status):
+    for single_status in (status if isinstance(status, list) else [status]):
+        counts[single_status] = counts.get(single_status, 0) + 1
+
+def run_concurrently(items, worker, max_workers=DEFAULT_MAX_WORKERS, governor=None):
+    """
+    Runs 'worker(item)' for every item on a bounded thread pool.
+    The worker returns 'success', 'skipped' or 'failed' (or a list of them
+    when one item covers several operations, e.g. a batch); a worker that
+    raises is counted as 'failed'. When a ThrottleGovernor is given, it
+    decides how many of the workers may send requests at the same time.
+
+    Returns a list of (item, status) in the order of 'items' and a
+    dictionary of counts per status.
+    """
+    items = list(items)
+    progress = ProgressLine(len(items))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        statuses = list(executor.map(lambda item: _run_worker(worker, item, governor, progress), items))
+    progress.finish()
+
+    results = list(zip(items, statuses))
+    counts = {"success": 0, "skipped": 0, "failed": 0}
+    for status in statuses:
+        _count_status(counts, status)
+    return results, counts
+
+def stream_concurrently(items, worker, max_workers=DEFAULT_MAX_WORKERS, governor=None):
+    """
+    Like run_concurrently, but consumes 'items' lazily (e.g. a generator fed
+    by a pager) and keeps at most 2 * max_workers items queued. Memory stays
+    bounded and the first writes start as soon as the first item is ready.
+
+    Returns a dictionary of counts per status.
+    """
+    max_workers = max(1, max_workers)
+    counts = {"success": 0, "skipped": 0, "failed": 0}
+    counts_lock = threading.Lock()
+    queue_slots = threading.BoundedSemaphore(2 * max_workers)
+    progress = ProgressLine()
+
+    def on_done(future):
+        with counts_lock:
+            _count_status(counts, future.result())
+        queue_slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item in items:
+            queue_slots.acquire()
+            executor.submit(_run_worker, worker, item, governor, progress).add_done_callback(on_done)
+    progress.finish()
+    return counts
+
+def parallel_pager(endpoint, options, prefetch=PAGE_PREFETCH):
+    """
+    Iterates a paginated TSC listing like TSC.Pager(endpoint, options), with
+    the items in the same order. Once the first page has given the total
+    number of items, all remaining page numbers are known, so up to
+    'prefetch' of them are fetched concurrently ahead of the page being read.
+    'endpoint' is a TSC endpoint such as server.users or server.groups.
+    """
+    items, pagination = endpoint.get(options)
+    yield from items
+    if pagination.total_available is None or pagination.page_size <= 0:
+        return
+    page_size = pagination.page_size
+    last_page = math.ceil(pagination.total_available / page_size)
+
+    def fetch(page_number):
+        page_options = copy.deepcopy(options)
+        page_options.pagenumber = page_number
+        page_options.pagesize = page_size
+        return endpoint.get(page_options)[0]
+
+    with ThreadPoolExecutor(max_workers=max(1, prefetch)) as executor:
+        pending = deque()
+        next_page = pagination.page_number + 1
+        while pending or next_page <= last_page:
+            while next_page <= last_page and len(pending) < max(1, prefetch):
+                pending.append(executor.submit(fetch, next_page))
+                next_page += 1
+            yield from pending.popleft().result()
+
+def ask_max_workers():
+    """
+    Prompts for the concurrency limit, falling back to DEFAULT_MAX_WORKERS.
+    """
+    value = input(f"Enter max concurrent requests (default {DEFAULT_MAX_WORKERS}): ").strip()
+    return int(value) if value.isdigit() and int(value) > 0 else DEFAULT_MAX_WORKERS
+
+def resolve_max_workers(max_workers):
+    """
+    Returns the --max-workers value, or asks for it when it was not given
+    and the script runs interactively (DEFAULT_MAX_WORKERS otherwise).
+    """
+    if max_workers:
+        return max(1, max_workers)
+    return ask_max_workers() if sys.stdin.isatty() else DEFAULT_MAX_WORKERS
+
+def confirm(question, assume_yes=False):
+    """
+    Asks a yes/no question. With 'assume_yes' (--yes) the answer is yes without
+    a prompt; without a terminal to ask (e.g. under cron) the answer is no.
+    """
+    if assume_yes:
+        print(f"{question} y (--yes)")
+        return True
+    if not sys.stdin.isatty():
+        print(f"{question} n (no terminal, pass --yes to apply)")
+        return False
+    return input(f"{question} (y/N): ").strip().lower() == "y"
+
+def matches_any(name, patterns):
+    """
+    True when 'name' matches one of the exclusion patterns: shell-style globs
+    ('Test*', '*Contractors*') or, prefixed with 're:', regular expressions
+    ('re:^(QA|UAT) ').
+    """
+    for pattern in patterns:
+        if pattern.startswith("re:"):
+            if re.search(pattern[3:], name):
+                return True
+        elif fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+def add_site_arguments(parser, label):
+    """
+    Adds --site-<label>-url, --site-<label>-name and --site-<label>-pat-name for
+    one site. Each falls back to the TABLEAU_SITE_<LABEL>_URL / _NAME / _PAT_NAME
+    environment variable. The PAT secret is never taken from the command line:
+    it is read from the variable named by --site-<label>-pat-secret-env
+    (default TABLEAU_SITE_<LABEL>_PAT_SECRET).
+    """
+    prefix = f"TABLEAU_SITE_{label.upper()}"
+    group = parser.add_argument_group(f"Site {label.upper()}")
+    group.add_argument(f"--site-{label}-url", default=os.environ.get(f"{prefix}_URL"),
+                       help=f"Server URL (env {prefix}_URL)")
+    group.add_argument(f"--site-{label}-name", default=os.environ.get(f"{prefix}_NAME"),
+                       help=f"Site content URL / site ID (env {prefix}_NAME)")
+    group.add_argument(f"--site-{label}-pat-name", default=os.environ.get(f"{prefix}_PAT_NAME"),
+                       help=f"PAT name (env {prefix}_PAT_NAME)")
+    group.add_argument(f"--site-{label}-pat-secret-env", default=f"{prefix}_PAT_SECRET",
+                       help=f"Environment variable holding the PAT secret (default {prefix}_PAT_SECRET)")
+
+def site_from_args(args, label):
+    """
+    Returns the site dictionary ('server_url', 'site', 'pat_name', 'pat_secret')
+    given by add_site_arguments() options and environment variables. Values
+    still missing are prompted for on a terminal; without one the script exits.
+    """
+    secret_env = getattr(args, f"site_{label}_pat_secret_env")
+    values = {
+        "server_url": getattr(args, f"site_{label}_url"),
+        "site": getattr(args, f"site_{label}_name"),
+        "pat_name": getattr(args, f"site_{label}_pat_name"),
+        "pat_secret": os.environ.get(secret_env),
+    }
+    prompts = [
+        ("server_url", f"--site-{label}-url", f"Enter Site {label.upper()} URL (e.g., https://your-tableau-cloud-url): "),
+        ("site", f"--site-{label}-name", f"Enter Site {label.upper()} Name (This is the Site ID / Content URL): "),
+        ("pat_name", f"--site-{label}-pat-name", f"Enter PAT name for Site {label.upper()}: "),
+        ("pat_secret", f"${secret_env}", f"Enter PAT value for Site {label.upper()}: "),
+    ]
+    for key, option, prompt in prompts:
+        if values[key]:
+            continue
+        if not sys.stdin.isatty():
+            sys.exit(f"Missing {option} for Site {label.upper()} (no terminal to prompt on).")
+        values[key] = input(prompt).strip()
+    return values
@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tableau_common import DEFAULT_MAX_WORKERS, SESSIONS, STATS, ProgressLine, add_stats_arguments, session_for_host
+
+# Number of sites (or site pairs) processed at the same time
+DEFAULT_MAX_SITES = 16
+
+# Example config (JSON, or the same structure in YAML):
+# {
+#   "sites": [
+#     {"name": "media", "server_url": "https://prod-apsoutheast-a.online.tableau.com", "site": "sphmedia",
+#      "pat_name": "admin-pat", "pat_secret_env": "MEDIA_PAT_SECRET"}
+#   ],
+#   "group_migrations": [
+#     {"source": "media", "destination": "media-uat", "exclude": ["Contractors", "Test *", "re:^QA-\\d+$"],
+#      "mirror": true, "max_deletions": 20}
+#   ],
+#   "membership_syncs": [
+#     {"source": "media", "destination": "media-uat", "stream": false, "mirror": true, "max_removals": 500}
+#   ]
+# }
+# Secrets can be given inline as "pat_secret" or read from the environment with "pat_secret_env".
+# Exclusions are group names, shell-style globs or regexes prefixed with "re:".
+# "mirror" also deletes destination groups (or removes memberships) missing on the source,
+# up to the "max_deletions" / "max_removals" safety cap.
+# Every membership sync keeps its own progress journal ("journal_file", default
+# sync_progress.<source>-<destination>.journal) so concurrent pairs never share one.
+
+def load_config(path):
+    """
+    Loads a JSON or YAML (.yaml/.yml, needs PyYAML) config file.
+    """
+    with open(path, "r") as file:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                sys.exit("PyYAML is required for YAML configs (pip install pyyaml).")
+            return yaml.safe_load(file)
+        return json.load(file)
+
+def resolve_site(site):
+    """
+    Returns a copy of a site entry with 'pat_secret' filled from 'pat_secret_env' when needed.
+    """
+    site = dict(site)
+    if not site.get("pat_secret") and site.get("pat_secret_env"):
+        site["pat_secret"] = os.environ.get(site["pat_secret_env"], "")
+    site.setdefault("name", f"{site['server_url']} {site['site']}")
+    return site
+
+def run_fan_out(jobs, job, max_sites):
+    """
+    Runs 'job' for every entry in parallel, so the total run time is bounded
+    by the slowest site rather than the sum of all of them.
+    Returns one result dictionary per entry, in order.
+    """
+    def timed(entry):
+        started = time.monotonic()
+        try:
+            result = job(entry)
+        except (Exception, SystemExit) as e:
+            # connect_to_site() exits on a failed sign-in; only that site fails here
+            result = {"status": "FAILED", "details": str(e) or type(e).__name__}
+        result["seconds"] = time.monotonic() - started
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_sites, len(jobs)))) as executor:
+        return list(executor.map(timed, jobs))
+
+def validate_site(site, max_sites=DEFAULT_MAX_SITES):
+    """
+    Signs in to one site with its PAT over the shared per-host session,
+    pooled for the 'max_sites' sign-ins that may run at the same time.
+    The token is kept in the shared cache for reuse by later runs.
+    """
+    session = session_for_host(site["server_url"], max_sites)
+    signed_in = SESSIONS.sign_in(session, site["server_url"], site["site"], site["pat_name"], site["pat_secret"],
+                                 force=True)
+    return {"status": "OK", "details": f"Token expires in: {signed_in['expires_in']}"}
+
+def migrate_site_groups(migration, max_workers):
+    """
+    Copies groups with their attributes and members for one source -> destination pair
+    (see group_migration.propagate_groups). "members": false copies the groups only.
+    """
+    from group_migration import DEFAULT_MAX_DELETIONS, propagate_groups
+
+    counts = propagate_groups(migration["source"], migration["destination"], migration.get("exclude", []),
+                              max_workers, migration.get("mirror", False),
+                              migration.get("max_deletions", DEFAULT_MAX_DELETIONS), migration.get("members", True))
+    status = "OK" if not counts["failed"] else "PARTIAL"
+    details = (f"Created: {counts.get('created', 0)}, Updated: {counts.get('updated', 0)}, "
+               f"Members added: {counts.get('members_success', 0)}, Failed: {counts['failed']}")
+    if "deleted" in counts:
+        details += f", Deleted: {counts['deleted']}"
+    return {"status": status, "details": details}
+
+def sync_site_memberships(pair, max_workers):
+    """
+    Syncs group memberships for one source -> destination pair without prompts
+    (see tableau_sync_user_groups.sync_site_pair).
+    """
+    from tableau_sync_user_groups import DEFAULT_MAX_REMOVALS, sync_site_pair
+
+    source, destination = pair["source"], pair["destination"]
+    default_journal = re.sub(r"[^\w.-]+", "_", f"sync_progress.{source['name']}-{destination['name']}.journal")
+    counts = sync_site_pair(source, destination, max_workers, stream=pair.get("stream", False),
+                            resume=pair.get("resume", False), journal_file=pair.get("journal_file", default_journal),
+                            assume_yes=True, mirror=pair.get("mirror", False),
+                            max_removals=pair.get("max_removals", DEFAULT_MAX_REMOVALS))
+    if counts is None:
+        return {"status": "OK", "details": "No changes applied"}
+    status = "OK" if not counts["failed"] else "PARTIAL"
+    details = f"Applied: {counts['success']}, Skipped: {counts['skipped']}, Failed: {counts['failed']}"
+    return {"status": status, "details": details}
+
+def print_results(names, results):
+    """
+    Prints one consolidated table of all site results.
+    """
+    width = max([len("Site")] + [len(name) for name in names])
+    print(f"\n{'Site':<{width}}  {'Status':<8}  {'Time':>7}  Details")
+    print(f"{'-' * width}  {'-' * 8}  {'-' * 7}  {'-' * 7}")
+    for name, result in zip(names, results):
+        print(f"{name:<{width}}  {result['status']:<8}  {result['seconds']:>6.1f}s  {result['details']}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate PATs, migrate groups or sync group memberships across many Tableau sites "
+                    "without prompts (e.g. from cron).")
+    parser.add_argument("action", choices=["validate", "migrate-groups", "sync-memberships"])
+    parser.add_argument("config", help="JSON or YAML file listing 'sites', 'group_migrations' and 'membership_syncs'")
+    parser.add_argument("--max-sites", type=int, default=DEFAULT_MAX_SITES,
+                        help=f"Sites processed in parallel (default {DEFAULT_MAX_SITES})")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Concurrent writes per destination site (default {DEFAULT_MAX_WORKERS})")
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+    ProgressLine.enabled = args.progress
+
+    config = load_config(args.config)
+    sites = {site["name"]: site for site in map(resolve_site, config.get("sites", []))}
+
+    if args.action == "validate":
+        names = list(sites)
+        results = run_fan_out([sites[name] for name in names], lambda site: validate_site(site, args.max_sites),
+                              args.max_sites)
+    else:
+        section, job = {
+            "migrate-groups": ("group_migrations", migrate_site_groups),
+            "sync-memberships": ("membership_syncs", sync_site_memberships),
+        }[args.action]
+        pairs = [
+            dict(pair, source=sites[pair["source"]], destination=sites[pair["destination"]])
+            for pair in config.get(section, [])
+        ]
+        names = [f"{pair['source']['name']} -> {pair['destination']['name']}" for pair in pairs]
+        results = run_fan_out(pairs, lambda pair: job(pair, args.max_workers), args.max_sites)
+
+    print_results(names, results)
+    STATS.print_summary(args.stats_json)
+    if any(result["status"] != "OK" for result in results):
+        sys.exit(1)
+
+# Run the main function when the script is executed
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,11 @@ import tkinter as tk
 from tkinter import messagebox, ttk
 import os
 import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import xml.etree.ElementTree as ET
+from tableau_common import RETRY_STATUSES, SESSIONS, session_for_host
 
 # File to store PAT credentials
 CREDENTIALS_FILE = "pat_credentials.json"
@@ -12,6 +15,13 @@ CREDENTIALS_FILE = "pat_credentials.json"
 # Tableau Cloud Base URL
 BASE_URL = "https://prod-apsoutheast-a.online.tableau.com"  # Replace with your specific URL
 API_VERSION = "3.24"  # Adjust API version if needed
+SITE_CONTENT_URL = "sphmedia"  # Replace with your site's content URL
+
+# Number of PATs validated at the same time
+VALIDATION_WORKERS = 16
+
+# Shared, pooled session: retries sign-in with backoff when the server throttles (429) or fails (5xx)
+session = session_for_host(BASE_URL, VALIDATION_WORKERS)
 
 # Save multiple PAT credentials to a file
 def save_credentials(pat_name, pat_secret):
@@ -50,45 +60,38 @@ def load_credentials():
     return []  # Return an empty list if no credentials are found
 
 
-# Validate PAT and return site name
-def validate_pat(pat_name, pat_secret):
-    url = f"{BASE_URL}/api/{API_VERSION}/auth/signin"
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "credentials": {
-            "personalAccessTokenName": pat_name,
-            "personalAccessTokenSecret": pat_secret,
-            "site": {"contentUrl": "sphmedia"},  # Replace with your site's content URL
-        }
-    }
-
+# Validate PAT and return a dictionary with 'valid', 'site', 'expires_in' and a display 'message'
+def check_pat(pat_name, pat_secret, base_url=BASE_URL, content_url=SITE_CONTENT_URL, http=None):
     try:
-        # Send POST request
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
-
-        # Parse XML response
-        root = ET.fromstring(response.text)
-
-        # Extract site details
-        credentials = root.find(".//{http://tableau.com/api}credentials")
-        site = credentials.find("{http://tableau.com/api}site")
-        site_name = site.attrib.get("contentUrl", "Unknown Site")
-
-        # Fetch additional details (e.g., token expiration)
-        time_to_expire = credentials.attrib.get("estimatedTimeToExpiration")
+        # Always a fresh sign-in; the token is kept in the shared cache for reuse by the other scripts
+        signed_in = SESSIONS.sign_in(http or session, base_url, content_url, pat_name, pat_secret, API_VERSION, force=True)
 
+        site_name = signed_in["content_url"]
+        time_to_expire = signed_in["expires_in"]
         success_message = f"Connected to site: {site_name}, Token expires in: {time_to_expire}"
-        return success_message
+        return {"valid": True, "site": site_name, "expires_in": time_to_expire, "message": success_message}
+
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code in RETRY_STATUSES:
+            message = f"Server busy (HTTP {e.response.status_code}). Please try again later."
+        else:
+            message = "Invalid token. Please check if the token name and secret are correct."
 
     except requests.exceptions.RequestException:
-        return "Invalid token. Please check if the token name and secret are correct."
+        message = "Invalid token. Please check if the token name and secret are correct."
 
     except ET.ParseError:
-        return "Failed to parse XML response."
+        message = "Failed to parse XML response."
 
     except Exception as e:
-        return f"Unexpected error: {e}"
+        message = f"Unexpected error: {e}"
+
+    return {"valid": False, "site": "", "expires_in": "", "message": message}
+
+
+# Validate PAT and return a message with the site name
+def validate_pat(pat_name, pat_secret):
+    return check_pat(pat_name, pat_secret)["message"]
 
 
 # Main UI Application
@@ -105,6 +108,13 @@ class TableauUserManager:
         self.credentials = load_credentials()
         self.auth_token = None
 
+        # Validation runs on background threads; results come back through
+        # this queue and are applied on the Tk main thread by poll_results
+        self.executor = ThreadPoolExecutor(max_workers=VALIDATION_WORKERS)
+        self.results = queue.Queue()
+        self.root.after(100, self.poll_results)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
         # Styling for modern look with smaller fonts
         self.style = ttk.Style()
         self.style.configure('TButton', font=('Helvetica', 10), padding=5)
@@ -152,8 +162,12 @@ class TableauUserManager:
         self.delete_pat_button = tk.Button(root, text="Delete PAT", command=self.delete_pat, font=('Helvetica', 10))
         self.delete_pat_button.grid(row=6, column=0, columnspan=2, pady=5)
 
-        self.connection_label = tk.Label(root, text="", fg="green", font=('Helvetica', 10))
-        self.connection_label.grid(row=7, column=0, columnspan=2, pady=5)
+        # Validate All Section
+        self.validate_all_button = tk.Button(root, text="Validate all saved PATs", command=self.validate_all, font=('Helvetica', 10))
+        self.validate_all_button.grid(row=7, column=0, columnspan=2, pady=5)
+
+        self.connection_label = tk.Label(root, text="", fg="green", font=('Helvetica', 10), wraplength=420)
+        self.connection_label.grid(row=8, column=0, columnspan=3, pady=5)
 
         # Load credentials if available
         if self.credentials and isinstance(self.credentials, list) and self.credentials:
@@ -169,37 +183,94 @@ class TableauUserManager:
             self.pat_secret_entry.config(show="*")
             self.show_secret_button.config(text="Show Secret")
 
+    def run_in_background(self, callback, func, *args):
+        # Run func(*args) on the executor and hand its result to callback on the Tk main thread
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(lambda done: done.cancelled() or self.results.put((callback, done.result())))
+
+    def poll_results(self):
+        # Apply finished background results; Tk widgets must only be touched from this thread
+        while True:
+            try:
+                callback, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            callback(result)
+        self.root.after(100, self.poll_results)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
     def validate_pat(self):
         pat_name = self.pat_name_entry.get()
         pat_secret = self.pat_secret_entry.get()
         if pat_name and pat_secret:
-            result_message = validate_pat(pat_name, pat_secret)
-            self.connection_label.config(text=result_message, fg="red" if "Invalid" in result_message else "green")
+            self.connection_label.config(text="Validating PAT...", fg="black")
+            self.validate_button.config(state=tk.DISABLED)
+            self.run_in_background(self.show_validation_result, check_pat, pat_name, pat_secret)
         else:
             messagebox.showerror("Error", "Please provide both PAT Name and Secret.")
 
+    def show_validation_result(self, result):
+        self.validate_button.config(state=tk.NORMAL)
+        self.connection_label.config(text=result["message"], fg="green" if result["valid"] else "red")
+
     def save_pat(self):
         pat_name = self.pat_name_entry.get()
         pat_secret = self.pat_secret_entry.get()
         if pat_name and pat_secret:
-            # First validate the PAT
-            result_message = validate_pat(pat_name, pat_secret)
-            if "Invalid" in result_message:
-                messagebox.showerror("Error", "Invalid PAT token. Please validate the token before saving.")
-                return
-
-            try:
-                save_credentials(pat_name, pat_secret)
-                self.connection_label.config(text="PAT saved successfully!", fg="green")
-                self.credentials = load_credentials()  # Reload credentials
-                pat_names = [cred['pat_name'] for cred in self.credentials if isinstance(cred, dict)]
-                self.pat_combobox['values'] = pat_names
-                self.pat_combobox.current(0)
-            except ValueError as e:
-                messagebox.showerror("Error", str(e))
+            # First validate the PAT, then save it once the result is back
+            self.connection_label.config(text="Validating PAT before saving...", fg="black")
+            self.save_pat_button.config(state=tk.DISABLED)
+            self.run_in_background(lambda result: self.finish_save_pat(pat_name, pat_secret, result),
+                                   check_pat, pat_name, pat_secret)
         else:
             messagebox.showerror("Error", "Please provide both PAT Name and Secret.")
 
+    def finish_save_pat(self, pat_name, pat_secret, result):
+        self.save_pat_button.config(state=tk.NORMAL)
+        if not result["valid"]:
+            self.connection_label.config(text=result["message"], fg="red")
+            messagebox.showerror("Error", "Invalid PAT token. Please validate the token before saving.")
+            return
+
+        try:
+            save_credentials(pat_name, pat_secret)
+            self.connection_label.config(text="PAT saved successfully!", fg="green")
+            self.credentials = load_credentials()  # Reload credentials
+            pat_names = [cred['pat_name'] for cred in self.credentials if isinstance(cred, dict)]
+            self.pat_combobox['values'] = pat_names
+            self.pat_combobox.current(0)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+
+    def validate_all(self):
+        # Check every saved PAT concurrently and list the results in a separate window
+        saved = [cred for cred in load_credentials() if isinstance(cred, dict)]
+        if not saved:
+            messagebox.showerror("Error", "No saved PATs to validate.")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("Saved PAT Status")
+        columns = ("pat_name", "status", "site", "expires_in")
+        table = ttk.Treeview(window, columns=columns, show="headings", height=min(len(saved), 20))
+        for column, heading, width in zip(columns, ("PAT Name", "Status", "Site", "Expires In"), (140, 220, 120, 120)):
+            table.heading(column, text=heading)
+            table.column(column, width=width)
+        table.pack(fill="both", expand=True, padx=10, pady=10)
+
+        for index, cred in enumerate(saved):
+            table.insert("", tk.END, iid=str(index), values=(cred.get("pat_name", ""), "Checking...", "", ""))
+
+            def show_row(result, index=index, cred=cred):
+                if table.winfo_exists():
+                    status = "Valid" if result["valid"] else result["message"]
+                    table.item(str(index), values=(cred.get("pat_name", ""), status, result["site"], result["expires_in"]))
+
+            self.run_in_background(show_row, check_pat, cred.get("pat_name", ""), cred.get("pat_secret", ""))
+
     def load_pat_details(self):
         selected_pat_name = self.pat_combobox.get()
         if selected_pat_name:
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+import time
+
+# File holding the local snapshots of site users, groups and memberships
+SNAPSHOT_FILE = "tableau_snapshots.db"
+
+# Snapshots older than this (in seconds) are refreshed from the server
+DEFAULT_MAX_AGE = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    server_url TEXT, site TEXT, section TEXT, fetched_at REAL,
+    PRIMARY KEY (server_url, site, section)
+);
+CREATE TABLE IF NOT EXISTS users (
+    server_url TEXT, site TEXT, name TEXT, id TEXT,
+    PRIMARY KEY (server_url, site, name)
+);
+CREATE TABLE IF NOT EXISTS group_members_fetched (
+    server_url TEXT, site TEXT, group_id TEXT, group_name TEXT, fetched_at REAL,
+    PRIMARY KEY (server_url, site, group_id)
+);
+CREATE TABLE IF NOT EXISTS group_members (
+    server_url TEXT, site TEXT, group_id TEXT, user_name TEXT
+);
+CREATE INDEX IF NOT EXISTS group_members_by_group ON group_members (server_url, site, group_id);
+"""
+
+class SiteSnapshot:
+    """
+    Local SQLite snapshot of one site's users and group memberships,
+    keyed by server URL and site content URL.
+
+    Every section is only fetched from the server when its snapshot is older
+    than 'max_age' seconds. Memberships are refreshed per group, so a refresh
+    only re-pages the members of groups that are new or whose snapshot is stale.
+    The group membership methods can be called from worker threads.
+    """
+    def __init__(self, server_url, site_name, max_age=DEFAULT_MAX_AGE, path=SNAPSHOT_FILE):
+        self.key = (server_url.rstrip("/"), site_name)
+        self.max_age = max_age
+        # Several site pairs may share the file when run from one process, wait for their writes
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript(SCHEMA)
+
+    def _is_fresh(self, fetched_at):
+        return fetched_at is not None and time.time() - fetched_at < self.max_age
+
+    def _section_fetched_at(self, section):
+        row = self.connection.execute(
+            "SELECT fetched_at FROM sections WHERE server_url = ? AND site = ? AND section = ?",
+            (*self.key, section)).fetchone()
+        return row[0] if row else None
+
+    def _cached_map(self, table, fetch):
+        """
+        Returns the cached {name: id} map of a table such as 'users', calling
+        fetch() and replacing the snapshot when it is missing or stale.
+        """
+        if self._is_fresh(self._section_fetched_at(table)):
+            rows = self.connection.execute(
+                f"SELECT name, id FROM {table} WHERE server_url = ? AND site = ?", self.key).fetchall()
+            print(f"Using cached {table} for site '{self.key[1]}' ({len(rows)} found).")
+            return dict(rows)
+
+        name_id_map = fetch()
+        with self.connection:
+            self.connection.execute(f"DELETE FROM {table} WHERE server_url = ? AND site = ?", self.key)
+            self.connection.executemany(
+                f"INSERT INTO {table} (server_url, site, name, id) VALUES (?, ?, ?, ?)",
+                [(*self.key, name, item_id) for name, item_id in name_id_map.items()])
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sections (server_url, site, section, fetched_at) VALUES (?, ?, ?, ?)",
+                (*self.key, table, time.time()))
+        return name_id_map
+
+    def users(self, fetch):
+        """
+        Returns the {username: user ID} map, from the snapshot or from fetch().
+        """
+        return self._cached_map("users", fetch)
+
+    def group_members(self, group_id):
+        """
+        Returns the cached usernames of a group, or None when they are stale or missing.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fetched_at FROM group_members_fetched WHERE server_url = ? AND site = ? AND group_id = ?",
+                (*self.key, group_id)).fetchone()
+            if not row or not self._is_fresh(row[0]):
+                return None
+            rows = self.connection.execute(
+                "SELECT user_name FROM group_members WHERE server_url = ? AND site = ? AND group_id = ?",
+                (*self.key, group_id)).fetchall()
+        return [user_name for (user_name,) in rows]
+
+    def save_group_members(self, group_id, group_name, user_names):
+        """
+        Replaces the cached usernames of a group.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM group_members WHERE server_url = ? AND site = ? AND group_id = ?",
+                (*self.key, group_id))
+            self.connection.executemany(
+                "INSERT INTO group_members (server_url, site, group_id, user_name) VALUES (?, ?, ?, ?)",
+                [(*self.key, group_id, user_name) for user_name in user_names])
+            self.connection.execute(
+                "INSERT OR REPLACE INTO group_members_fetched (server_url, site, group_id, group_name, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (*self.key, group_id, group_name, time.time()))
+
+    def expire_group_members(self, group_ids):
+        """
+        Marks the cached memberships of groups as stale, e.g. after writing to them.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM group_members_fetched WHERE server_url = ? AND site = ? AND group_id = ?",
+                [(*self.key, group_id) for group_id in set(group_ids)])
+
+    def forget_groups_except(self, group_ids):
+        """
+        Drops cached memberships of groups that no longer exist on the site.
+        """
+        group_ids = set(group_ids)
+        rows = self.connection.execute(
+            "SELECT group_id FROM group_members_fetched WHERE server_url = ? AND site = ?", self.key).fetchall()
+        removed = [(*self.key, group_id) for (group_id,) in rows if group_id not in group_ids]
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM group_members WHERE server_url = ? AND site = ? AND group_id = ?", removed)
+            self.connection.executemany(
+                "DELETE FROM group_members_fetched WHERE server_url = ? AND site = ? AND group_id = ?", removed)
+
+    def close(self):
+        self.connection.close()
@@ -1,177 +1,703 @@
 import tableauserverclient as TSC
+import argparse
+import os
 import sys
+import threading
+from collections import namedtuple
+from tableau_common import (STATS, DEFAULT_MAX_WORKERS, MAX_PAGE_SIZE, ProgressLine, add_site_arguments,
+                            add_stats_arguments, confirm, connect_to_site, parallel_pager, resolve_max_workers,
+                            run_concurrently, site_from_args, stream_concurrently)
+from tableau_snapshot import DEFAULT_MAX_AGE, SNAPSHOT_FILE, SiteSnapshot
 
-def connect_to_site(server_url, site_name, token_name, token_value):
+# Users sent per bulk "add users to group" request
+BULK_ADD_BATCH_SIZE = 100
+
+# Progress journal of memberships confirmed on Site B, used by --resume
+JOURNAL_FILE = "sync_progress.journal"
+
+# Mirror mode refuses to remove more memberships than this unless --max-removals is raised
+DEFAULT_MAX_REMOVALS = 500
+
+# One membership that exists on Site A but is missing on Site B
+MembershipAdd = namedtuple("MembershipAdd", ["user_name", "user_id", "group_name", "group_id"])
+
+# One membership on Site B that does not exist on Site A (mirror mode)
+MembershipRemove = namedtuple("MembershipRemove", ["user_name", "user_id", "group_name", "group_id"])
+
+# --- New Helper Functions for this Script ---
+
+class SyncJournal:
     """
-    Authenticates and connects to a specific Tableau site using a PAT.
-    Returns a server object.
-    'site_name' MUST be the Content URL (Site ID), not the friendly name.
+    Append-only progress journal of memberships confirmed on Site B
+    (added, or found to be there already), one "group_id<TAB>user_id" per line.
+    The first line records the site pair so a journal is never resumed
+    against different sites. A run that finishes without failures deletes
+    its journal (complete(), or retire() when it finds nothing to apply),
+    so only an unfinished run can be resumed.
     """
-    print(f"Attempting to connect to site '{site_name}' at {server_url}...")
-    try:
-        tableau_auth = TSC.PersonalAccessTokenAuth(token_name, token_value, site_name)
-        server = TSC.Server(server_url, use_server_version=True)
-        server.auth.sign_in(tableau_auth)
-        
-        # We will NOT access any server attributes here (like server.site_id)
-        print(f"Successfully signed in to site '{site_name}'.") 
-        return server
-        
-    except Exception as e:
-        print(f"FATAL ERROR connecting to site '{site_name}': {e}")
-        print("Please check your URL, Site Name (must be Content URL/Site ID), and PAT details.")
-        sys.exit(1) # Exit the script if connection fails
+    def __init__(self, path, site_pair, resume):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        header = self.header(site_pair)
+        if resume and os.path.exists(path):
+            with open(path, "r") as file:
+                if file.readline() == header:
+                    self.done = {tuple(line.rstrip("\n").split("\t")) for line in file if "\t" in line}
+                    print(f"Resuming: {len(self.done)} memberships already confirmed in '{path}'.")
+                else:
+                    print(f"WARNING: Journal '{path}' belongs to other sites. Starting over.")
+                    resume = False
+        elif resume:
+            print(f"WARNING: No journal found at '{path}'. Starting from the beginning.")
+            resume = False
+        self.file = open(path, "a" if resume else "w")
+        if not resume:
+            self.file.write(header)
+            self.file.flush()
 
-# --- New Helper Functions for this Script ---
+    @staticmethod
+    def header(site_pair):
+        return f"# {site_pair}\n"
+
+    @classmethod
+    def retire(cls, path, site_pair):
+        """
+        Deletes a journal left at 'path' by an earlier run of 'site_pair' once
+        a run finds nothing to apply. Journals of other site pairs are kept.
+        """
+        try:
+            with open(path, "r") as file:
+                if file.readline() != cls.header(site_pair):
+                    return
+        except FileNotFoundError:
+            return
+        os.remove(path)
+        print(f"Sites are in sync, journal '{path}' of an earlier run removed.")
+
+    def is_done(self, add):
+        return (add.group_id, add.user_id) in self.done
 
-def get_all_users(server):
+    def record(self, adds):
+        with self.lock:
+            for add in adds:
+                self.file.write(f"{add.group_id}\t{add.user_id}\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def complete(self):
+        """
+        Retires the journal after a run without failures.
+        """
+        self.close()
+        os.remove(self.path)
+        print(f"Sync finished without failures, journal '{self.path}' removed.")
+
+def page_options(fields=None):
+    """
+    Returns RequestOptions for the largest page size the REST API allows and,
+    when the installed TSC supports field projection, asks only for 'fields'.
+    """
+    options = TSC.RequestOptions(pagesize=MAX_PAGE_SIZE)
+    if fields and hasattr(options, "fields"):
+        options.fields = set(fields)
+    return options
+
+def get_all_users(server, snapshot=None):
     """
     Fetches all users from a server and returns a dictionary
     mapping their username (e.g., email) to their user ID.
+    Served from 'snapshot' (a SiteSnapshot) when it is fresh.
     
     Example: {'user@example.com': 'user-id-123', ...}
     """
-    print(f"Fetching all users from site '{server.site_id}'...")
-    all_users = TSC.Pager(server.users)
-    user_map = {user.name: user.id for user in all_users}
-    print(f"Found {len(user_map)} users.")
-    return user_map
+    def fetch():
+        print(f"Fetching all users from site '{server.site_id}'...")
+        all_users = parallel_pager(server.users, page_options(fields=["id", "name"]))
+        user_map = {user.name: user.id for user in all_users}
+        print(f"Found {len(user_map)} users.")
+        return user_map
+
+    return snapshot.users(fetch) if snapshot else fetch()
 
-def get_group_name_id_map(server):
+def get_group_items(server):
     """
-    Fetches all groups from a server and returns a dictionary
-    mapping the group name to its group ID. Excludes 'All Users'.
-    
-    Example: {'Sales Group': 'group-id-abc', ...}
+    Fetches all groups from a server once and returns a dictionary
+    mapping the group ID to its GroupItem. Excludes 'All Users'.
+
+    Example: {'group-id-abc': <GroupItem 'Sales Group'>, ...}
     """
     print(f"Fetching all groups from site '{server.site_id}'...")
-    all_groups = TSC.Pager(server.groups)
+    all_groups = parallel_pager(server.groups, page_options())
     # Exclude 'All Users' group as it's managed by Tableau
-    group_map = {group.name: group.id for group in all_groups if group.name != "All Users"}
-    print(f"Found {len(group_map)} groups (excluding 'All Users').")
-    return group_map
+    group_items = {group.id: group for group in all_groups if group.name != "All Users"}
+    print(f"Found {len(group_items)} groups (excluding 'All Users').")
+    return group_items
 
-def get_user_group_names(server, user_id):
+def get_group_name_id_map(server, group_items=None):
     """
-    Gets all group names for a specific user ID.
+    Returns a dictionary mapping the group name to its group ID. Excludes 'All Users'.
+    Reuses 'group_items' (from get_group_items) when given instead of re-listing groups.
+    
+    Example: {'Sales Group': 'group-id-abc', ...}
+    """
+    if group_items is None:
+        group_items = get_group_items(server)
+    return {group.name: group_id for group_id, group in group_items.items()}
+
+def get_group_memberships(server, snapshot=None):
+    """
+    Pages the members of every group on a server once and returns a dictionary
+    mapping each username to the list of group names it belongs to.
     Excludes 'All Users' group.
+
+    The number of API calls grows with the number of groups (and their size),
+    not with the number of users on the site. With a 'snapshot' (a SiteSnapshot),
+    only groups that are new or whose cached members are stale are paged.
+
+    Returns the memberships and the set of group names whose members could not
+    be read (their members are missing from the memberships, not empty).
+
+    Example: ({'user@example.com': ['Sales Group', 'Finance'], ...}, {'Broken Group'})
     """
-    try:
-        user_item = server.users.get_by_id(user_id)
-        server.users.populate_groups(user_item)
-        # Exclude 'All Users' group
-        group_names = [group.name for group in user_item.groups if group.name != "All Users"]
-        return group_names
-    except Exception as e:
-        print(f"  -> ERROR: Could not get groups for user ID {user_id}: {e}")
-        return []
+    print(f"Fetching group memberships from site '{server.site_id}'...")
+    memberships = {}
+    unreadable_groups = set()
+    group_ids = []
+    member_options = page_options()
+    for group in parallel_pager(server.groups, page_options()):
+        # Exclude 'All Users' group as it's managed by Tableau
+        if group.name == "All Users":
+            continue
+        group_ids.append(group.id)
+        user_names = snapshot.group_members(group.id) if snapshot else None
+        if user_names is None:
+            try:
+                server.groups.populate_users(group, member_options)
+                user_names = [user.name for user in group.users]
+            except Exception as e:
+                print(f"  -> ERROR: Could not get members for group '{group.name}': {e}")
+                unreadable_groups.add(group.name)
+                continue
+            if snapshot:
+                snapshot.save_group_members(group.id, group.name, user_names)
+        for user_name in user_names:
+            memberships.setdefault(user_name, []).append(group.name)
+    if snapshot:
+        snapshot.forget_groups_except(group_ids)
+    print(f"Found group memberships for {len(memberships)} users.")
+    return memberships, unreadable_groups
 
-def add_user_to_group(server, user_id, group_id, user_name, group_name):
+def add_user_to_group(server, user_id, group_id, user_name, group_name, group_items):
     """
     Adds a user to a specific group on the server (works across TSC versions).
-    Handles both group_id string and GroupItem object cases safely.
+    The GroupItem is looked up in 'group_items' (from get_group_items), so no
+    extra group listing is done per add.
+    Returns 'success', 'skipped' or 'failed'.
     """
     try:
-        # Step 1: Get the group object using its ID
-        all_groups = TSC.Pager(server.groups)
-        group_item = next((g for g in all_groups if g.id == group_id), None)
+        # Step 1: Resolve the group object from the cached index
+        group_item = group_items.get(group_id)
         if not group_item:
             print(f"  -> ERROR: Group '{group_name}' (ID: {group_id}) not found on Site B.")
-            return
+            return "failed"
         
         # Step 2: Add the user
         print(f"  -> Adding user '{user_name}' to group '{group_name}' on Site B...")
         server.groups.add_user(group_item, user_id)  # use GroupItem explicitly
         print(f"  -> SUCCESS: Added '{user_name}' to '{group_name}'.")
+        return "success"
         
     except TSC.ServerResponseError as e:
         if "is already a member" in str(e):
             print(f"  -> INFO: '{user_name}' already a member of '{group_name}'. Skipping.")
-        else:
-            print(f"  -> ERROR adding '{user_name}' to '{group_name}': {e}")
+            return "skipped"
+        print(f"  -> ERROR adding '{user_name}' to '{group_name}': {e}")
     except Exception as e:
         print(f"  -> UNEXPECTED ERROR while adding '{user_name}' to '{group_name}': {e}")
+    return "failed"
 
+def supports_bulk_membership(server, method="add_users"):
+    """
+    Returns True when both TSC and the server support adding (or, with
+    method="remove_users", removing) many users of a group in one request
+    (REST API 3.21 and later).
+    """
+    if not hasattr(server.groups, method):
+        return False
+    try:
+        return tuple(int(part) for part in server.version.split(".")) >= (3, 21)
+    except (AttributeError, ValueError):
+        return False
 
+def add_users_to_group(server, group_item, adds, group_items):
+    """
+    Adds a batch of users (MembershipAdd entries for the same group) in a
+    single request. If the batch is rejected, e.g. because one user was added
+    in the meantime, the batch is retried one user at a time.
+    Returns one status per user.
+    """
+    print(f"  -> Adding {len(adds)} users to group '{group_item.name}' on Site B...")
+    try:
+        server.groups.add_users(group_item, [add.user_id for add in adds])
+        print(f"  -> SUCCESS: Added {len(adds)} users to '{group_item.name}'.")
+        return ["success"] * len(adds)
+    except Exception as e:
+        print(f"  -> INFO: Bulk add to '{group_item.name}' failed ({e}). Retrying one user at a time.")
+        return [add_user_to_group(server, add.user_id, add.group_id, add.user_name, add.group_name, group_items)
+                for add in adds]
 
-# --- Main Script Execution ---
+def batch_adds_by_group(adds, batch_size=BULK_ADD_BATCH_SIZE):
+    """
+    Groups pending adds (or removes) by target group and splits them into batches
+    of at most 'batch_size' users. Returns a list of (group_id, [MembershipAdd]).
+    """
+    adds_by_group = {}
+    for add in adds:
+        adds_by_group.setdefault(add.group_id, []).append(add)
+    return [
+        (group_id, group_adds[start:start + batch_size])
+        for group_id, group_adds in adds_by_group.items()
+        for start in range(0, len(group_adds), batch_size)
+    ]
 
-def main():
-    # --- 1. Get Connection Details ---
-    
-    site_a_url = input("Enter Site A URL (e.g., https://your-tableau-cloud-url): ").strip()
-    site_a_name = input("Enter Site A Name (This is the Site ID / Content URL): ").strip()
-    site_a_token_name = input("Enter PAT name for Site A: ").strip()
-    site_a_token_value = input("Enter PAT value for Site A: ").strip()
+def add_batch_to_group(server, batch, group_items, bulk, journal=None):
+    """
+    Sends one (group_id, [MembershipAdd]) batch: in a single request when
+    'bulk' is True, otherwise one request per user. Returns one status per user.
+    Confirmed memberships are recorded in 'journal' (a SyncJournal) when given.
+    """
+    group_id, adds = batch
+    group_item = group_items.get(group_id)
+    if not group_item:
+        print(f"  -> ERROR: Group '{adds[0].group_name}' (ID: {group_id}) not found on Site B.")
+        return ["failed"] * len(adds)
+    if bulk:
+        statuses = add_users_to_group(server, group_item, adds, group_items)
+    else:
+        statuses = [add_user_to_group(server, add.user_id, add.group_id, add.user_name, add.group_name, group_items)
+                    for add in adds]
+    if journal:
+        journal.record(add for add, status in zip(adds, statuses) if status != "failed")
+    return statuses
 
-    site_b_url = input("Enter Site B URL (e.g., https://your-tableau-cloud-url): ").strip()
-    site_b_name = input("Enter Site B Name (This is the Site ID / Content URL): ").strip()
-    site_b_token_name = input("Enter PAT name for Site B: ").strip()
-    site_b_token_value = input("Enter PAT value for Site B: ").strip()
+def remove_user_from_group(server, group_item, remove):
+    """
+    Removes one user (a MembershipRemove) from a group on the server.
+    A user who is no longer a member counts as 'skipped'.
+    Returns 'success', 'skipped' or 'failed'.
+    """
+    try:
+        print(f"  -> Removing user '{remove.user_name}' from group '{remove.group_name}' on Site B...")
+        server.groups.remove_user(group_item, remove.user_id)
+        print(f"  -> SUCCESS: Removed '{remove.user_name}' from '{remove.group_name}'.")
+        return "success"
+    except TSC.ServerResponseError as e:
+        if str(e.code).startswith("404"):
+            print(f"  -> INFO: '{remove.user_name}' is not a member of '{remove.group_name}'. Skipping.")
+            return "skipped"
+        print(f"  -> ERROR removing '{remove.user_name}' from '{remove.group_name}': {e}")
+    except Exception as e:
+        print(f"  -> UNEXPECTED ERROR while removing '{remove.user_name}' from '{remove.group_name}': {e}")
+    return "failed"
+
+def remove_batch_from_group(server, batch, group_items, bulk):
+    """
+    Sends one (group_id, [MembershipRemove]) batch: in a single request when
+    'bulk' is True (falling back to one request per user if it is rejected),
+    otherwise one request per user. Returns one status per user.
+    """
+    group_id, removes = batch
+    group_item = group_items.get(group_id)
+    if not group_item:
+        print(f"  -> ERROR: Group '{removes[0].group_name}' (ID: {group_id}) not found on Site B.")
+        return ["failed"] * len(removes)
+    if bulk:
+        print(f"  -> Removing {len(removes)} users from group '{group_item.name}' on Site B...")
+        try:
+            server.groups.remove_users(group_item, [remove.user_id for remove in removes])
+            print(f"  -> SUCCESS: Removed {len(removes)} users from '{group_item.name}'.")
+            return ["success"] * len(removes)
+        except Exception as e:
+            print(f"  -> INFO: Bulk removal from '{group_item.name}' failed ({e}). Retrying one user at a time.")
+    return [remove_user_from_group(server, group_item, remove) for remove in removes]
+
+class CompactMembershipIndex:
+    """
+    Memory-compact view of Site B used by the streaming sync.
+    Every username is interned once and numbered; each group keeps only the
+    set of member numbers, so checks are integer set lookups.
+    """
+    def __init__(self):
+        self.user_numbers = {}   # interned username -> number
+        self.user_ids = []       # number -> Site B user ID
+        self.group_members = {}  # group name -> set of member numbers
+
+    def add_user(self, user_name, user_id):
+        self.user_numbers[sys.intern(user_name)] = len(self.user_ids)
+        self.user_ids.append(user_id)
+
+    def user_id(self, user_name):
+        number = self.user_numbers.get(user_name)
+        return None if number is None else self.user_ids[number]
+
+    def add_member(self, group_name, user_name):
+        number = self.user_numbers.get(user_name)
+        if number is not None:
+            self.group_members.setdefault(group_name, set()).add(number)
+
+    def is_member(self, group_name, user_name):
+        return self.user_numbers.get(user_name) in self.group_members.get(group_name, ())
+
+def build_compact_index(server, group_items):
+    """
+    Builds a CompactMembershipIndex of a site's users and group memberships,
+    consuming users and members page by page without keeping the items.
+    """
+    print(f"Indexing users and memberships of site '{server.site_id}'...")
+    index = CompactMembershipIndex()
+    for user in parallel_pager(server.users, page_options(fields=["id", "name"])):
+        index.add_user(user.name, user.id)
+    member_options = page_options()
+    for group in group_items.values():
+        try:
+            server.groups.populate_users(group, member_options)
+            for user in group.users:
+                index.add_member(group.name, user.name)
+        except Exception as e:
+            print(f"  -> ERROR: Could not get members for group '{group.name}': {e}")
+    print(f"Indexed {len(index.user_ids)} users and {len(index.group_members)} non-empty groups.")
+    return index
+
+def stream_missing_adds(server_a, index_b, groups_in_site_b, batch_size, stats, journal=None):
+    """
+    Pages Site A groups and their members and yields (group_id, [MembershipAdd])
+    batches of memberships missing on Site B as soon as they are found.
+    Memberships already confirmed in 'journal' are left out.
+    Skipped users and groups are tallied in 'stats'.
+    """
+    member_options = page_options()
+    for group in parallel_pager(server_a.groups, page_options()):
+        # Exclude 'All Users' group as it's managed by Tableau
+        if group.name == "All Users":
+            continue
+        if group.name not in groups_in_site_b:
+            print(f"WARNING: Group '{group.name}' exists in Site A but not Site B. Skipping.")
+            stats["missing_groups"] += 1
+            continue
+        group_id_b = groups_in_site_b[group.name]
+        batch = []
+        try:
+            server_a.groups.populate_users(group, member_options)
+            for user in group.users:
+                user_id_b = index_b.user_id(user.name)
+                if user_id_b is None:
+                    stats["missing_users"] += 1
+                elif index_b.is_member(group.name, user.name):
+                    stats["existing"] += 1
+                else:
+                    add = MembershipAdd(user.name, user_id_b, group.name, group_id_b)
+                    if journal and journal.is_done(add):
+                        stats["existing"] += 1
+                        continue
+                    batch.append(add)
+                    if len(batch) >= batch_size:
+                        yield group_id_b, batch
+                        batch = []
+        except Exception as e:
+            print(f"  -> ERROR: Could not get members for group '{group.name}': {e}")
+        if batch:
+            yield group_id_b, batch
+
+def stream_sync(server_a, server_b, group_items, max_workers, governor=None, journal=None):
+    """
+    Memory-bounded sync for very large sites: Site B is held in a
+    CompactMembershipIndex, and Site A memberships are compared and written
+    page by page as they arrive instead of after a full download.
+    Returns a dictionary of counts per status ('success', 'skipped', 'failed').
+    """
+    index_b = build_compact_index(server_b, group_items)
+    groups_in_site_b = get_group_name_id_map(server_b, group_items)
+    bulk = supports_bulk_membership(server_b)
+    stats = {"missing_users": 0, "missing_groups": 0, "existing": 0}
+
+    print("\n--- Streaming User Group Synchronization ---")
+    batches = stream_missing_adds(server_a, index_b, groups_in_site_b, BULK_ADD_BATCH_SIZE if bulk else 1,
+                                  stats, journal)
+    counts = stream_concurrently(batches,
+                                 lambda batch: add_batch_to_group(server_b, batch, group_items, bulk, journal),
+                                 max_workers, governor)
+    print(f"\nAdded: {counts['success']}, Skipped: {counts['skipped']}, Failed: {counts['failed']}")
+    print(f"{stats['existing']} memberships already in place, {stats['missing_users']} memberships of users "
+          f"and {stats['missing_groups']} groups missing on Site B.")
+    return counts
+
+def plan_membership_sync(users_in_site_a, users_in_site_b, memberships_in_site_a,
+                         memberships_in_site_b, groups_in_site_b, groups_in_site_a=None):
+    """
+    Computes the memberships to write to Site B as the set difference between
+    Site A and Site B memberships, keyed by (username, group name).
+    Nothing is sent to the server here.
+
+    With 'groups_in_site_a' (mirror mode), the reverse difference is computed
+    in the same pass: Site B memberships of groups that exist on both sites
+    but have no matching membership on Site A are planned for removal.
+    Groups that only exist on Site B are left alone (see group_migration.py --mirror).
+
+    Returns a dictionary:
+      'adds'           -> list of MembershipAdd still missing on Site B
+      'removes'        -> list of MembershipRemove (mirror mode only)
+      'missing_users'  -> Site A usernames that do not exist on Site B
+      'missing_groups' -> Site A group names that do not exist on Site B
+      'existing'       -> number of Site A memberships already present on Site B
+    """
+    existing_in_site_b = {
+        (user_name, group_name)
+        for user_name, group_names in memberships_in_site_b.items()
+        for group_name in group_names
+    }
+    plan = {"adds": [], "removes": [], "missing_users": [], "missing_groups": set(), "existing": 0}
+
+    if groups_in_site_a is not None:
+        existing_in_site_a = {
+            (user_name, group_name)
+            for user_name, group_names in memberships_in_site_a.items()
+            for group_name in group_names
+        }
+        for user_name, group_name in existing_in_site_b - existing_in_site_a:
+            if group_name in groups_in_site_a and user_name in users_in_site_b:
+                plan["removes"].append(MembershipRemove(
+                    user_name, users_in_site_b[user_name], group_name, groups_in_site_b[group_name]))
+
+    for user_name in users_in_site_a:
+        if user_name not in users_in_site_b:
+            plan["missing_users"].append(user_name)
+            continue
+        for group_name in memberships_in_site_a.get(user_name, []):
+            if group_name not in groups_in_site_b:
+                plan["missing_groups"].add(group_name)
+            elif (user_name, group_name) in existing_in_site_b:
+                plan["existing"] += 1
+            else:
+                plan["adds"].append(MembershipAdd(
+                    user_name, users_in_site_b[user_name], group_name, groups_in_site_b[group_name]))
+    return plan
+
+def print_sync_plan(plan):
+    """
+    Prints a sync plan (from plan_membership_sync) as a dry run.
+    """
+    print("\n--- Sync Plan (Dry Run) ---")
+    for user_name in plan["missing_users"]:
+        print(f"Skipping user: '{user_name}' (Not found in Site B).")
+    for group_name in sorted(plan["missing_groups"]):
+        print(f"WARNING: Group '{group_name}' exists in Site A but not Site B. Skipping.")
+    for add in plan["adds"]:
+        print(f"  -> Will add '{add.user_name}' to group '{add.group_name}'.")
+    for remove in plan["removes"]:
+        print(f"  -> Will remove '{remove.user_name}' from group '{remove.group_name}'.")
+    print(f"\n{len(plan['adds'])} memberships to add, {len(plan['removes'])} to remove, "
+          f"{plan['existing']} already in place, "
+          f"{len(plan['missing_users'])} users and {len(plan['missing_groups'])} groups missing on Site B.")
+
+def execute_sync_plan(server, plan, group_items, max_workers, governor=None, journal=None):
+    """
+    Sends only the missing memberships from a sync plan to the server,
+    with up to 'max_workers' requests in flight over the same signed-in session.
+    The governor (from connect_to_site) lowers that limit while the server throttles.
+    When the server supports it, users joining the same group are sent in
+    batches of BULK_ADD_BATCH_SIZE per request; otherwise one request per user.
+    Memberships already confirmed in 'journal' (a SyncJournal) are not sent again.
+    Planned removals (mirror mode) go through the same pool, batched the same way.
+    Returns a dictionary of counts per status ('success', 'skipped', 'failed').
+    """
+    adds = plan["adds"]
+    if journal:
+        adds = [add for add in adds if not journal.is_done(add)]
+        if len(adds) < len(plan["adds"]):
+            print(f"Resuming: skipping {len(plan['adds']) - len(adds)} memberships confirmed in a previous run.")
+    bulk = supports_bulk_membership(server)
+    if not bulk:
+        print("INFO: Server does not support bulk group membership, adding users one at a time.")
+    bulk_remove = supports_bulk_membership(server, "remove_users")
+    batches = (batch_adds_by_group(adds, BULK_ADD_BATCH_SIZE if bulk else 1)
+               + batch_adds_by_group(plan["removes"], BULK_ADD_BATCH_SIZE if bulk_remove else 1))
+
+    def write_batch(batch):
+        if isinstance(batch[1][0], MembershipRemove):
+            return remove_batch_from_group(server, batch, group_items, bulk_remove)
+        return add_batch_to_group(server, batch, group_items, bulk, journal)
+
+    results, counts = run_concurrently(batches, write_batch, max_workers, governor)
+    if plan["removes"]:
+        removed = sum(statuses.count("success") for (_, batch), statuses in results
+                      if isinstance(batch[0], MembershipRemove))
+        print(f"\nAdded: {counts['success'] - removed}, Removed: {removed}, "
+              f"Skipped: {counts['skipped']}, Failed: {counts['failed']}")
+    else:
+        print(f"\nAdded: {counts['success']}, Skipped: {counts['skipped']}, Failed: {counts['failed']}")
+    return counts
+
+# --- Main Script Execution ---
+
+def sync_site_pair(site_a, site_b, max_workers, stream=False, resume=False, journal_file=JOURNAL_FILE,
+                   snapshot_file=SNAPSHOT_FILE, max_age=DEFAULT_MAX_AGE, assume_yes=False,
+                   mirror=False, max_removals=DEFAULT_MAX_REMOVALS):
+    """
+    Syncs group memberships from one site to another without further prompts
+    than the confirmation before writing (answered by 'assume_yes').
+    Each site is a dictionary with 'server_url', 'site', 'pat_name' and 'pat_secret'.
+    With 'mirror', Site B memberships missing on Site A are removed as well,
+    unless there are more than 'max_removals' of them.
+    Returns the counts per status of the writes, or None when nothing was applied.
+    """
+    site_pair = f"{site_a['server_url']} {site_a['site']} -> {site_b['server_url']} {site_b['site']}"
+    counts = None
 
     server_a = None
     server_b = None
+    # Removals are decided from Site A memberships, in mirror mode they are always read live
+    # (and the snapshot refreshed) so a membership made since the last snapshot is not removed
+    snapshot_a = SiteSnapshot(site_a["server_url"], site_a["site"], 0 if mirror else max_age, snapshot_file)
+    snapshot_b = SiteSnapshot(site_b["server_url"], site_b["site"], max_age, snapshot_file)
+    journal = None
 
     try:
         # --- 2. Connect to Both Sites ---
         print("\n--- Connecting to Site A (Source) ---")
-        server_a = connect_to_site(site_a_url, site_a_name, site_a_token_name, site_a_token_value)
+        server_a, _ = connect_to_site(site_a["server_url"], site_a["site"], site_a["pat_name"], site_a["pat_secret"])
         
         print("\n--- Connecting to Site B (Destination) ---")
-        server_b = connect_to_site(site_b_url, site_b_name, site_b_token_name, site_b_token_value)
+        server_b, governor_b = connect_to_site(site_b["server_url"], site_b["site"], site_b["pat_name"],
+                                               site_b["pat_secret"], max_workers)
 
-        # --- 3. Fetch Data ---
-        print("\n--- Gathering Data from Servers ---")
-        # Get all users from Site A (Source)
-        users_in_site_a = get_all_users(server_a) # {'user@a.com': 'id_a1'}
+        # --- 3a. Streaming mode: write while Site A is still being read ---
+        if stream:
+            group_items_in_site_b = get_group_items(server_b) # {'id_g1': GroupItem}
+            if confirm("\nStreaming mode writes to Site B without a dry run. Continue?", assume_yes):
+                # Site B memberships are about to change, do not serve them from the snapshot next run
+                snapshot_b.expire_group_members(group_items_in_site_b)
+                journal = SyncJournal(journal_file, site_pair, resume)
+                counts = stream_sync(server_a, server_b, group_items_in_site_b, max_workers, governor_b, journal)
+                if not counts["failed"]:
+                    journal.complete()
+        else:
+            # --- 3b. Fetch Data ---
+            print("\n--- Gathering Data from Servers ---")
+            # Get all users from Site A (Source)
+            users_in_site_a = get_all_users(server_a, snapshot_a) # {'user@a.com': 'id_a1'}
         
-        # Get all users from Site B (Destination)
-        users_in_site_b = get_all_users(server_b) # {'user@a.com': 'id_b1'}
+            # Get all users from Site B (Destination)
+            users_in_site_b = get_all_users(server_b, snapshot_b) # {'user@a.com': 'id_b1'}
         
-        # Get all groups from Site B (Destination)
-        groups_in_site_b = get_group_name_id_map(server_b) # {'Group 1': 'id_g1'}
+            # Get all groups from Site B (Destination)
+            group_items_in_site_b = get_group_items(server_b) # {'id_g1': GroupItem}
+            groups_in_site_b = get_group_name_id_map(server_b, group_items_in_site_b) # {'Group 1': 'id_g1'}
 
-        print("\n--- Starting User Group Synchronization ---")
-        
-        # --- 4. Main Synchronization Loop ---
-        for user_name, user_id_a in users_in_site_a.items():
-            
-            if user_name in users_in_site_b:
-                user_id_b = users_in_site_b[user_name]
-                print(f"\nProcessing user: '{user_name}' (Exists on both sites)")
-                
-                groups_for_user_in_a = get_user_group_names(server_a, user_id_a)
-                
-                if not groups_for_user_in_a:
-                    print(f"  -> User '{user_name}' is not in any groups on Site A. Nothing to sync.")
-                    continue
-                
-                print(f"  -> Found in Site A groups: {groups_for_user_in_a}")
-
-                for group_name in groups_for_user_in_a:
-                    
-                    if group_name in groups_in_site_b:
-                        group_id_b = groups_in_site_b[group_name]
-                        add_user_to_group(server_b, user_id_b, group_id_b, user_name, group_name)
-                    else:
-                        print(f"  -> WARNING: Group '{group_name}' exists in Site A but not Site B. Skipping.")
-            
+            # Get every user's group memberships on both sites, one pass per group
+            memberships_in_site_a, unreadable_in_site_a = get_group_memberships(server_a, snapshot_a) # {'user@a.com': ['Group 1']}
+            memberships_in_site_b, _ = get_group_memberships(server_b, snapshot_b) # {'user@a.com': ['Group 2']}
+
+            # Mirror mode also needs the Site A groups without members
+            groups_in_site_a = get_group_name_id_map(server_a) if mirror else None
+            if mirror:
+                # A group whose Site A members could not be read is not empty, never remove its Site B members
+                for group_name in sorted(unreadable_in_site_a):
+                    print(f"WARNING: Members of '{group_name}' could not be read on Site A. "
+                          f"No memberships will be removed from it.")
+                    groups_in_site_a.pop(group_name, None)
+
+            # --- 4. Plan: only memberships missing on Site B (and, mirroring, extra ones) ---
+            plan = plan_membership_sync(users_in_site_a, users_in_site_b, memberships_in_site_a,
+                                        memberships_in_site_b, groups_in_site_b, groups_in_site_a)
+            print_sync_plan(plan)
+            if len(plan["removes"]) > max_removals:
+                print(f"\nWARNING: {len(plan['removes'])} removals exceed the safety cap of {max_removals} "
+                      f"(--max-removals). No memberships will be removed.")
+                plan["removes"] = []
+
+            changes = len(plan["adds"]) + len(plan["removes"])
+            if not changes:
+                print("\nNo membership changes to apply to Site B.")
+                # Nothing left to resume, retire what an interrupted earlier run left behind
+                SyncJournal.retire(journal_file, site_pair)
+            elif confirm(f"\nApply {changes} membership changes to Site B?", assume_yes):
+                print("\n--- Starting User Group Synchronization ---")
+                # Site B memberships are about to change, do not serve them from the snapshot next run
+                snapshot_b.expire_group_members(change.group_id for change in plan["adds"] + plan["removes"])
+                journal = SyncJournal(journal_file, site_pair, resume)
+                counts = execute_sync_plan(server_b, plan, group_items_in_site_b, max_workers, governor_b, journal)
+                if not counts["failed"]:
+                    journal.complete()
             else:
-                print(f"\nSkipping user: '{user_name}' (Not found in Site B).")
+                print("\nDry run only. No changes were made to Site B.")
+
+    finally:
+        # --- 5. Keep Sessions ---
+        # No sign out: the cached session tokens are reused by the next run
+        if server_a or server_b:
+            print("\nSession tokens kept for reuse by the next run.")
+        snapshot_a.close()
+        snapshot_b.close()
+        if journal:
+            journal.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Copy user group memberships from Site A to Site B. Sites, PATs and concurrency can be "
+                    "given as options or environment variables for unattended runs; anything missing is "
+                    "prompted for on a terminal.")
+    add_site_arguments(parser, "a")
+    add_site_arguments(parser, "b")
+    parser.add_argument("--max-workers", type=int,
+                        help=f"Concurrent writes to Site B (default: prompt, or {DEFAULT_MAX_WORKERS} without a terminal)")
+    parser.add_argument("--yes", action="store_true", help="Apply the changes without asking for confirmation")
+    parser.add_argument("--mirror", action="store_true",
+                        help="Also remove Site B memberships that do not exist on Site A (groups on both sites only)")
+    parser.add_argument("--max-removals", type=int, default=DEFAULT_MAX_REMOVALS,
+                        help=f"In mirror mode, remove nothing if more memberships than this would be removed "
+                             f"(default {DEFAULT_MAX_REMOVALS})")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE,
+                        help=f"Refetch cached users/groups/memberships older than this many seconds "
+                             f"(default {DEFAULT_MAX_AGE}, 0 forces a full refetch)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Compare and write Site A memberships page by page with bounded memory "
+                             "(no dry run, for very large sites)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip memberships confirmed by an interrupted earlier run (see --journal-file)")
+    parser.add_argument("--journal-file", default=JOURNAL_FILE,
+                        help=f"Progress journal written during the sync (default {JOURNAL_FILE})")
+    parser.add_argument("--snapshot-file", default=SNAPSHOT_FILE,
+                        help=f"SQLite file holding the site snapshots (default {SNAPSHOT_FILE})")
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+    if args.mirror and args.stream:
+        parser.error("--mirror needs the full Site A memberships and cannot be combined with --stream")
+    ProgressLine.enabled = args.progress
+
+    # --- 1. Get Connection Details ---
+    site_a = site_from_args(args, "a")
+    site_b = site_from_args(args, "b")
+    max_workers = resolve_max_workers(args.max_workers)
 
+    failed = False
+    try:
+        counts = sync_site_pair(site_a, site_b, max_workers, args.stream, args.resume, args.journal_file,
+                                args.snapshot_file, args.max_age, args.yes, args.mirror, args.max_removals)
+        failed = bool(counts and counts["failed"])
     except Exception as e:
         print(f"\nAn unexpected error occurred: {e}")
-    
-    finally:
-        # --- 5. Sign Out ---
-        if server_a:
-            server_a.auth.sign_out()
-            print("\nSigned out from Site A.")
-        if server_b:
-            server_b.auth.sign_out()
-            print("Signed out from Site B.")
+        failed = True
 
+    STATS.print_summary(args.stats_json)
     print("\n--- Synchronization Script Finished ---")
+    # Non-zero exit status for schedulers when any write failed or the run broke off
+    if failed:
+        sys.exit(1)
+
 # Run the main function when the script is executed
 if __name__ == "__main__":
     main()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tableau_common
+from group_migration import propagate_groups
+from mock_tableau_server import MockTableauServer, seed_sites
+
+class GroupMigrationTest(unittest.TestCase):
+    """
+    Group migration (with mirror deletions) against the mock server.
+    """
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        cache_file = mock.patch.object(tableau_common.SESSIONS, "cache_file",
+                                       os.path.join(self.workdir.name, "tokens.json"))
+        cache_file.start()
+        self.addCleanup(cache_file.stop)
+        self.addCleanup(self.workdir.cleanup)
+
+        self.server = MockTableauServer(("127.0.0.1", 0))
+        self.site_a, _, self.site_c = seed_sites(self.server, users=200, groups=4)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def site(self, content_url):
+        return {"server_url": self.server.url, "site": content_url, "pat_name": "test", "pat_secret": "test"}
+
+    def migrate(self, **options):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return propagate_groups(self.site("site-a"), self.site("site-c"), max_workers=4, max_age=0,
+                                    snapshot_file=os.path.join(self.workdir.name, "snapshots.db"), **options)
+
+    def group_names(self, site):
+        return {group["name"] for group in site.groups.values()}
+
+    def test_created_ad_group_keeps_its_imported_members(self):
+        group = next(group for group in self.site_a.groups.values() if group["name"] == "Group 00000")
+        group["domain"] = "example.com"
+        member_names = {self.site_a.users[user_id]["name"] for user_id in group["members"]}
+        self.site_c.directory[("example.com", "Group 00000")] = member_names
+
+        counts = self.migrate()
+        self.assertEqual(counts["failed"], 0)
+        # Imported members are read back, not re-added (and answered with a 409)
+        self.assertEqual(counts.get("members_skipped", 0), 0)
+        migrated = next(group for group in self.site_c.groups.values() if group["name"] == "Group 00000")
+        self.assertEqual(migrated["domain"], "example.com")
+        self.assertEqual({self.site_c.users[user_id]["name"] for user_id in migrated["members"]},
+                         {user["name"] for user in self.site_c.users.values()} & member_names)
+
+    def test_group_differing_only_in_case_is_updated_without_a_create(self):
+        group_id = self.site_c.add_group("group 00001")
+        self.server.reset_stats()
+        counts = self.migrate()
+        self.assertEqual(counts["failed"], 0)
+        self.assertEqual(counts["created"], 3)
+        self.assertEqual(self.server.stats()["calls"].get("POST /sites/{site}/groups"), 3)
+        self.assertTrue(self.site_c.groups[group_id]["members"])
+
+    def test_mirror_deletes_groups_missing_on_site_a(self):
+        self.site_c.add_group("Stale group")
+        counts = self.migrate(mirror=True)
+        self.assertEqual(counts["deleted"], 1)
+        self.assertEqual(self.group_names(self.site_c), self.group_names(self.site_a))
+
+    def test_mirror_keeps_groups_differing_only_in_case(self):
+        group_id = self.site_c.add_group("group 00001")
+        counts = self.migrate(mirror=True)
+        self.assertEqual(counts["deleted"], 0)
+        self.assertIn(group_id, self.site_c.groups)
+        self.assertTrue(self.site_c.groups[group_id]["members"])
+
+    def test_mirror_keeps_excluded_groups(self):
+        self.site_c.add_group("Keep me")
+        self.migrate(mirror=True, exclude_patterns=["Keep*"])
+        self.assertIn("Keep me", self.group_names(self.site_c))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import tableauserverclient as TSC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tableau_common
+from mock_tableau_server import MockRequestHandler, MockTableauServer, seed_sites
+from tableau_common import connect_to_site, parallel_pager
+
+class ParallelPagerTest(unittest.TestCase):
+    """
+    parallel_pager against a mock server serving at most 100 items per page:
+    prefetched pages must come back in page order.
+    """
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        cache_file = mock.patch.object(tableau_common.SESSIONS, "cache_file",
+                                       os.path.join(self.workdir.name, "tokens.json"))
+        cache_file.start()
+        self.addCleanup(cache_file.stop)
+        self.addCleanup(self.workdir.cleanup)
+
+        self.server = MockTableauServer(("127.0.0.1", 0), max_page_size=100)
+        seed_sites(self.server, users=1050, groups=4)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.site_server, _ = connect_to_site(self.server.url, "site-a", "test", "test")
+
+    def user_names(self, prefetch):
+        return [user.name for user in parallel_pager(self.site_server.users, TSC.RequestOptions(pagesize=1000),
+                                                     prefetch)]
+
+    def test_pages_are_read_once_in_order(self):
+        expected = [user["name"] for user in self.server.sites["site-a"].users.values()]
+        self.server.reset_stats()
+        self.assertEqual(self.user_names(prefetch=4), expected)
+        self.assertEqual(self.server.stats()["calls"]["GET /sites/{site}/users"], 11)
+
+    def test_order_holds_when_later_pages_answer_first(self):
+        list_users = MockRequestHandler.list_users
+
+        def slow_early_pages(handler, site):
+            # Page 2 answers last, page 11 first
+            time.sleep(0.2 / int(handler.query.get("pageNumber", 1)))
+            return list_users(handler, site)
+
+        expected = self.user_names(prefetch=1)
+        with mock.patch.object(MockRequestHandler, "list_users", slow_early_pages):
+            self.assertEqual(self.user_names(prefetch=10), expected)
+        self.assertEqual(len(expected), 1050)
+
+if __name__ == "__main__":
+    unittest.main()
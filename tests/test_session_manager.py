@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import tableauserverclient as TSC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tableau_common
+from mock_tableau_server import MockTableauServer, seed_sites
+from tableau_common import connect_to_site, parallel_pager
+
+class SessionManagerTest(unittest.TestCase):
+    """
+    Session tokens against a mock server whose tokens expire after a second:
+    an expired token is replaced by one new sign-in, and the rejected
+    requests are sent again.
+    """
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        cache_file = mock.patch.object(tableau_common.SESSIONS, "cache_file",
+                                       os.path.join(self.workdir.name, "tokens.json"))
+        cache_file.start()
+        self.addCleanup(cache_file.stop)
+        self.addCleanup(self.workdir.cleanup)
+
+        self.server = MockTableauServer(("127.0.0.1", 0), max_page_size=100, token_ttl=1)
+        seed_sites(self.server, users=1050, groups=4)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def connect(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return connect_to_site(self.server.url, "site-a", "test", "test", max_workers=4)[0]
+
+    def sign_ins(self):
+        return self.server.stats()["calls"].get("POST /auth/signin", 0)
+
+    def test_expired_token_signs_in_once_for_concurrent_requests(self):
+        site_server = self.connect()
+        self.assertEqual(self.sign_ins(), 1)
+        pages = parallel_pager(site_server.users, TSC.RequestOptions(pagesize=1000), prefetch=4)
+        users = [next(pages) for _ in range(100)]
+        # The token expires mid-listing, before the remaining pages are fetched 4 at a time
+        time.sleep(1.2)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            users += list(pages)
+        self.assertEqual(len(users), 1050)
+        self.assertEqual(len({user.id for user in users}), 1050)
+        self.assertEqual(self.sign_ins(), 2)
+
+    def test_later_requests_use_the_new_token(self):
+        site_server = self.connect()
+        time.sleep(1.2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            site_server.groups.get()
+        self.server.reset_stats()
+
+        site_server.groups.get()
+        self.assertEqual(self.server.stats()["calls"], {"GET /sites/{site}/groups": 1})
+
+    def test_cached_token_is_reused_by_the_next_connection(self):
+        self.connect()
+        self.connect()
+        self.assertEqual(self.sign_ins(), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tableau_common
+from mock_tableau_server import MockRequestHandler, MockTableauServer, seed_sites
+from tableau_sync_user_groups import sync_site_pair
+
+class SyncJournalTest(unittest.TestCase):
+    """
+    The progress journal of a sync against the mock server: it is only kept
+    while there is something left to resume.
+    """
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        cache_file = mock.patch.object(tableau_common.SESSIONS, "cache_file",
+                                       os.path.join(self.workdir.name, "tokens.json"))
+        cache_file.start()
+        self.addCleanup(cache_file.stop)
+        self.addCleanup(self.workdir.cleanup)
+
+        self.server = MockTableauServer(("127.0.0.1", 0))
+        self.site_a, self.site_b, _ = seed_sites(self.server, users=200, groups=4)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.journal_file = os.path.join(self.workdir.name, "sync.journal")
+
+    def site(self, content_url):
+        return {"server_url": self.server.url, "site": content_url, "pat_name": "test", "pat_secret": "test"}
+
+    def sync(self, **options):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return sync_site_pair(self.site("site-a"), self.site("site-b"), 4, assume_yes=True, max_age=0,
+                                  snapshot_file=os.path.join(self.workdir.name, "snapshots.db"),
+                                  journal_file=self.journal_file, **options)
+
+    def write_journal(self, site_pair):
+        with open(self.journal_file, "w") as file:
+            file.write(f"# {site_pair}\n")
+
+    def site_pair(self):
+        return f"{self.server.url} site-a -> {self.server.url} site-b"
+
+    def group_id(self, site, group_name):
+        return next(group_id for group_id, group in site.groups.items() if group["name"] == group_name)
+
+    def test_resume_skips_memberships_confirmed_by_the_interrupted_run(self):
+        broken_group = self.group_id(self.site_b, "Group 00000")
+        add_group_users = MockRequestHandler.add_group_users
+        groups_written = []
+
+        def fail_broken_group(handler, site, group):
+            if group == broken_group:
+                return handler.error(400, "400000", "Bad Request", "Group could not be updated.")
+            return add_group_users(handler, site, group)
+
+        def record_group(handler, site, group):
+            groups_written.append(group)
+            return add_group_users(handler, site, group)
+
+        with mock.patch.object(MockRequestHandler, "add_group_users", fail_broken_group):
+            counts = self.sync()
+        self.assertTrue(counts["failed"])
+        self.assertTrue(os.path.exists(self.journal_file))
+        self.assertEqual(self.site_b.groups[broken_group]["members"], set())
+        # Memberships confirmed in the journal are not sent again, even when Site B no longer has them
+        confirmed_group = self.group_id(self.site_b, "Group 00001")
+        self.site_b.groups[confirmed_group]["members"].clear()
+
+        with mock.patch.object(MockRequestHandler, "add_group_users", record_group):
+            counts = self.sync(resume=True)
+        self.assertEqual(counts["failed"], 0)
+        self.assertEqual(set(groups_written), {broken_group})
+        self.assertTrue(self.site_b.groups[broken_group]["members"])
+        self.assertEqual(self.site_b.groups[confirmed_group]["members"], set())
+        self.assertFalse(os.path.exists(self.journal_file))
+
+    def test_run_with_nothing_to_apply_retires_an_earlier_journal(self):
+        self.sync()
+        self.write_journal(self.site_pair())
+
+        self.sync()
+        self.assertFalse(os.path.exists(self.journal_file))
+
+    def test_run_with_nothing_to_apply_keeps_the_journal_of_other_sites(self):
+        self.sync()
+        self.write_journal(f"{self.server.url} site-a -> {self.server.url} site-c")
+
+        self.sync()
+        self.assertTrue(os.path.exists(self.journal_file))
+
+if __name__ == "__main__":
+    unittest.main()
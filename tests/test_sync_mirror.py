@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tableau_common
+from mock_tableau_server import MockRequestHandler, MockTableauServer, seed_sites
+from tableau_sync_user_groups import sync_site_pair
+
+class MirrorSyncTest(unittest.TestCase):
+    """
+    Mirror mode against the mock server: it must only remove memberships
+    that Site A is known not to have.
+    """
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        cache_file = mock.patch.object(tableau_common.SESSIONS, "cache_file",
+                                       os.path.join(self.workdir.name, "tokens.json"))
+        cache_file.start()
+        self.addCleanup(cache_file.stop)
+        self.addCleanup(self.workdir.cleanup)
+
+        self.server = MockTableauServer(("127.0.0.1", 0))
+        self.site_a, self.site_b, _ = seed_sites(self.server, users=200, groups=4)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def site(self, content_url):
+        return {"server_url": self.server.url, "site": content_url, "pat_name": "test", "pat_secret": "test"}
+
+    def sync(self, max_age=0, **options):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return sync_site_pair(self.site("site-a"), self.site("site-b"), 4, assume_yes=True, max_age=max_age,
+                                  snapshot_file=os.path.join(self.workdir.name, "snapshots.db"),
+                                  journal_file=os.path.join(self.workdir.name, "sync.journal"), **options)
+
+    def group_members(self, site, group_name):
+        return next(group["members"] for group in site.groups.values() if group["name"] == group_name)
+
+    def test_mirror_removes_memberships_missing_on_site_a(self):
+        self.sync()
+        self.group_members(self.site_a, "Group 00000").clear()
+        self.assertTrue(self.group_members(self.site_b, "Group 00000"))
+
+        self.sync(mirror=True)
+        self.assertEqual(self.group_members(self.site_b, "Group 00000"), set())
+        self.assertTrue(self.group_members(self.site_b, "Group 00001"))
+
+    def test_mirror_reads_site_a_live_instead_of_the_snapshot(self):
+        self.sync(max_age=3600)
+        # A user on both sites who is not (yet) a member of the group on Site A
+        names_in_site_b = {user["name"] for user in self.site_b.users.values()}
+        user_name = next(user["name"] for user_id, user in self.site_a.users.items()
+                         if user["name"] in names_in_site_b
+                         and user_id not in self.group_members(self.site_a, "Group 00000"))
+        user_ids = {site: next(user_id for user_id, user in site.users.items() if user["name"] == user_name)
+                    for site in (self.site_a, self.site_b)}
+        self.group_members(self.site_a, "Group 00000").add(user_ids[self.site_a])
+        self.group_members(self.site_b, "Group 00000").add(user_ids[self.site_b])
+
+        self.sync(max_age=3600, mirror=True)
+        self.assertIn(user_ids[self.site_b], self.group_members(self.site_b, "Group 00000"))
+
+    def test_mirror_keeps_members_of_groups_unreadable_on_site_a(self):
+        self.sync()
+        members_before = set(self.group_members(self.site_b, "Group 00000"))
+        self.assertTrue(members_before)
+        group_id_a = next(group_id for group_id, group in self.site_a.groups.items()
+                          if group["name"] == "Group 00000")
+        list_group_users = MockRequestHandler.list_group_users
+
+        def failing_list_group_users(handler, site, group):
+            if group == group_id_a:
+                return handler.error(403, "403000", "Forbidden", "Members cannot be listed.")
+            return list_group_users(handler, site, group)
+
+        with mock.patch.object(MockRequestHandler, "list_group_users", failing_list_group_users):
+            self.sync(mirror=True)
+        self.assertEqual(self.group_members(self.site_b, "Group 00000"), members_before)
+
+if __name__ == "__main__":
+    unittest.main()